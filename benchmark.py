@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+'''
+Performance measurements for the translation pipeline.
+
+Usage: benchmark.py [--jobs N] [--deps F] [--directives N] [--arrays F] [--repeat N] [--seed N] [--memo]
+                    [--output FILE]
+       benchmark.py --startup [--repeat N] [--output FILE]
+       benchmark.py --compare OLD NEW [--threshold F]
+
+Generates synthetic UGE and standard syntax scripts and times, separately, translator._translate, translator.getScript,
+script_scheduler_writer._parseCommand and translator._parseUGEdependencies. For each one it reports lines/sec and the
+peak memory of the process running it. --output saves the results as JSON. --compare reads two of those files and
+exits with status 1 if a measurement of NEW is slower than OLD by more than the threshold (default 0.1, 10%).
+--startup instead times whole runs of the command line, cold, in new processes: --help and the translation of a
+small script, through translate_script.py and through the bin/translate-script entry point.
+'''
+
+import sys
+import os
+import json
+import subprocess
+import tempfile
+import platform
+import random
+import time
+import timeit
+import multiprocessing
+import script_scheduler_writer
+import translate_script
+
+try:
+    import resource
+except ImportError:  # not available on Windows, the peak memory is reported as None
+    resource = None
+
+# job lines in standard syntax, the way translator._translate hands them to the writer
+_JOB_LINES = [
+    "JOB_NAME First_Job RESOURCE_NODES 8 RESOURCE_EXCLUSIVE ./job1.sh input_{0}",
+    "JOB_NAME Second_Job RESOURCE_MEM 2GB ./job2.sh TASK_ID {0}",
+    "JOB_NAME Third_Job JOB_ARRAY 1:{0} RESOURCE_PRIOR h_rt=12:00:00 ./job3.sh",
+    "LAUNCH JOB_NAME Fourth_Job RESOURCE_NODES 4 RESOURCE_MEM 200MB OUTPUT_CURRENT_DIR ./job4.sh -v {0}",
+    "./myprogram inputs_{0} > output_TASK_ID.txt",
+]
+
+_UGE_DIRECTIVES = ["#$ -l h_rt=12:00:00\n", "#$ -pe pe_slots 8\n", "#$ -l exclusive.c\n", "#$ -l ram.c=10G\n"]
+_STANDARD_DIRECTIVES = ["DEFAULT_CONFIG RESOURCE_PRIOR h_rt=12:00:00\n", "DEFAULT_CONFIG RESOURCE_NODES 8\n",
+                        "DEFAULT_CONFIG RESOURCE_EXCLUSIVE\n", "DEFAULT_CONFIG RESOURCE_MEM 10GB\n"]
+
+DEFAULT_PARAMETERS = {"jobs": 2000, "deps": 0.5, "directives": 20, "arrays": 0.1, "repeat": 3, "seed": 1,
+                      "memo": False}
+
+
+def generateJobLines(size):
+    '''
+    :return: list of size job lines in standard syntax
+    '''
+    return [_JOB_LINES[x % len(_JOB_LINES)].format(x) for x in range(size)]
+
+
+def _generateJobs(jobs, deps, arrays, seed):
+    '''
+    :return: list of (is an array, list of the earlier jobs it depends on) for each job, jobs numbered from 1
+    '''
+    generator = random.Random(seed)
+    result = []
+    for x in range(1, jobs + 1):
+        isArray = generator.random() < arrays
+        dependencies = []
+        if (x > 1 and generator.random() < deps):
+            dependencies = sorted(set(generator.randint(max(1, x - 50), x - 1) for y in range(generator.randint(1, 3))))
+        result.append((isArray, dependencies))
+    return result
+
+
+def generateUGEScript(jobs, deps=0.5, directives=20, arrays=0.1, seed=1):
+    '''
+    :param jobs: number of qsub lines
+    :param deps: fraction of the jobs holding on earlier jobs
+    :param directives: number of #$ lines
+    :param arrays: fraction of array jobs
+    :return: list of lines of a UGE script
+    '''
+    lines = ["#!/bin/bash\n", "#$ -M user@example.org\n", "#$ -m ae\n"]
+    for x in range(directives):
+        lines.append(_UGE_DIRECTIVES[x % len(_UGE_DIRECTIVES)])
+    for x, (isArray, dependencies) in enumerate(_generateJobs(jobs, deps, arrays, seed), 1):
+        line = "qsub -N job" + str(x) + " -pe pe_slots 4"
+        if (isArray):
+            line += " -t 1:" + str(x % 100 + 1)
+        if (dependencies):
+            line += " -hold_jid " + ",".join(["job" + str(d) for d in dependencies])
+        lines.append(line + " ./job" + str(x) + ".sh input_" + str(x) + "\n")
+        if (x % 10 == 0):
+            lines.append("echo submitted " + str(x) + "\n")
+    return lines
+
+
+def generateStandardScript(jobs, deps=0.5, directives=20, arrays=0.1, seed=1):
+    '''
+        Same as generateUGEScript, in standard syntax.
+    '''
+    lines = ["SHELL /bin/bash\n", "EMAIL user@example.org END ABORT\n"]
+    for x in range(directives):
+        lines.append(_STANDARD_DIRECTIVES[x % len(_STANDARD_DIRECTIVES)])
+    for x, (isArray, dependencies) in enumerate(_generateJobs(jobs, deps, arrays, seed), 1):
+        line = "JOB JOB_NAME job" + str(x) + " RESOURCE_NODES 4"
+        if (isArray):
+            line += " JOB_ARRAY 1:" + str(x % 100 + 1)
+        line += " ./job" + str(x) + ".sh input_" + str(x)
+        if (dependencies):
+            line += " DEPEND JOBS_LIST " + " ".join([str(d) for d in dependencies])
+        lines.append(line + "\n")
+        if (x % 10 == 0):
+            lines.append("LINE echo submitted " + str(x) + "\n")
+    return lines
+
+
+def _best(function, repeat):
+    '''
+    :return: best time, in seconds, of repeat calls to function
+    '''
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def benchParseCommand(scheduler, lines, repeat=3):
+    '''
+    :return: best time, in seconds, to parse every line in lines
+    '''
+    writer = script_scheduler_writer.script_scheduler_writer(scheduler)
+    parse = writer._parseCommand
+
+    def run():
+        for line in lines:
+            parse(line)
+    return _best(run, repeat)
+
+
+def benchTranslate(script, scheduler_in, scheduler_out, repeat=3):
+    '''
+    :return: best time, in seconds, of translator._translate on script
+    '''
+    writers = []
+
+    def run():
+        writer = translate_script.translator(script, scheduler_in, scheduler_out, True, False, "bench")
+        writer._translate()
+        writers.append(writer)  # freed after the measurement
+    seconds = _best(run, repeat)
+    del writers[:]
+    return seconds
+
+
+def benchGetScript(script, scheduler_in, scheduler_out, repeat=3):
+    '''
+    :return: best time, in seconds, of translator.getScript on script, translation included
+    '''
+    def run():
+        translate_script.translator(script, scheduler_in, scheduler_out, True, False, "bench").getScript()
+    return _best(run, repeat)
+
+
+def benchParseUGEdependencies(script, repeat=3):
+    '''
+    :return: (number of -hold_jid values in script, best time, in seconds, to parse them all)
+    '''
+    writer = translate_script.translator([], "UGE", "SLURM", True, False, "bench")
+    names = translate_script._JobNameIndex()
+    dependencies = []
+    for line in script:
+        words = line.split()
+        if (words and words[0] == "qsub"):
+            names.add(words[words.index("-N") + 1], names.size + 1)
+            if ("-hold_jid" in words):
+                dependencies.append(words[words.index("-hold_jid") + 1])
+
+    def run():
+        for d in dependencies:
+            writer._parseUGEdependencies(d, "SINGLE", names)
+    return (dependencies.__len__(), _best(run, repeat))
+
+
+def _peakMemory():
+    '''
+    :return: peak resident memory of this process in KB, or None
+    '''
+    if (resource is None):
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if (sys.platform == "darwin"):  # bytes on macOS, KB elsewhere
+        peak //= 1024
+    return peak
+
+
+def _runStage(stage, parameters):
+    '''
+        Runs a single measurement, see runBenchmarks.
+    :return: (number of lines processed, best time in seconds, peak memory in KB)
+    '''
+    if (not parameters["memo"]):
+        script_scheduler_writer.setLineMemoSize(0)
+    jobs, deps, directives, arrays, repeat, seed = [parameters[x] for x in
+                                                    ("jobs", "deps", "directives", "arrays", "repeat", "seed")]
+    if (stage.startswith("UGE")):
+        script = generateUGEScript(jobs, deps, directives, arrays, seed)
+    else:
+        script = generateStandardScript(jobs, deps, directives, arrays, seed)
+    scheduler_out = stage.split()[0].split("->")[1]
+    kind = stage.split()[1]
+    if (kind == "_translate"):
+        count, seconds = (script.__len__(), benchTranslate(script, stage.split("->")[0], scheduler_out, repeat))
+    elif (kind == "getScript"):
+        count, seconds = (script.__len__(), benchGetScript(script, stage.split("->")[0], scheduler_out, repeat))
+    elif (kind == "_parseCommand"):
+        lines = [x.split(None, 1)[1] for x in script if x.startswith("JOB ")]
+        count, seconds = (lines.__len__(), benchParseCommand(scheduler_out, lines, repeat))
+    else:
+        count, seconds = benchParseUGEdependencies(script, repeat)
+    return (count, seconds, _peakMemory())
+
+
+def _runStageInChild(stage, parameters, connection):
+    connection.send(_runStage(stage, parameters))
+    connection.close()
+
+
+STAGES = ["UGE->SLURM _translate", "UGE->SLURM getScript", "UGE->SLURM _parseUGEdependencies",
+          "->SLURM _translate", "->SLURM getScript", "->SLURM _parseCommand",
+          "->UGE _translate", "->UGE getScript", "->UGE _parseCommand"]
+
+
+def runBenchmarks(parameters):
+    '''
+        Each measurement runs in its own process, so that the peak memory is its own.
+    :param parameters: dictionary with the keys of DEFAULT_PARAMETERS
+    :return: dictionary of results, the way it is saved as JSON
+    '''
+    results = {}
+    for stage in STAGES:
+        parent, child = multiprocessing.Pipe(False)
+        process = multiprocessing.Process(target=_runStageInChild, args=(stage, parameters, child))
+        process.start()
+        count, seconds, peak = parent.recv()
+        process.join()
+        results[stage] = {"lines": count, "seconds": seconds, "linesPerSec": count / seconds if seconds else None,
+                          "peakMemoryKB": peak}
+    return {"parameters": parameters, "results": results, "python": platform.python_version(),
+            "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def _startupCommands(scriptFile):
+    '''
+    :return: list of (name, command) timed by runStartup
+    '''
+    directory = os.path.dirname(os.path.abspath(__file__))
+    script = os.path.join(directory, "translate_script.py")
+    entry = os.path.join(directory, "bin", "translate-script")
+    translate = [scriptFile, "-i", "UGE", "-o", "SLURM"]
+    return [("python -c pass", [sys.executable, "-c", "pass"]),
+            ("translate_script.py --help", [sys.executable, script, "--help"]),
+            ("translate_script.py FILE", [sys.executable, script] + translate),
+            ("translate-script --help", [sys.executable, entry, "--help"]),
+            ("translate-script FILE", [sys.executable, entry] + translate)]
+
+
+def runStartup(repeat=20):
+    '''
+        Times each command of _startupCommands in a new process, repeat times.
+    :return: dictionary of results, the way it is saved as JSON
+    '''
+    fd, scriptFile = tempfile.mkstemp(suffix=".sh")
+    with os.fdopen(fd, "w") as f:
+        f.writelines(generateUGEScript(20, directives=4))
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.path.dirname(os.path.abspath(__file__))  # for bin/translate-script
+    results = {}
+    try:
+        with open(os.devnull, "w") as devnull:
+            for name, command in _startupCommands(scriptFile):
+                times = []
+                for x in range(repeat):
+                    start = time.time()
+                    subprocess.call(command, stdout=devnull, stderr=devnull, env=environment)
+                    times.append(time.time() - start)
+                times.sort()
+                results[name] = {"medianMs": times[len(times) // 2] * 1000, "minMs": times[0] * 1000}
+    finally:
+        os.unlink(scriptFile)
+    return {"parameters": {"repeat": repeat}, "startup": results, "python": platform.python_version(),
+            "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "bytecode": not sys.dont_write_bytecode}
+
+
+def displayStartup(report):
+    print ("%-36s %12s %12s" % ("command", "median ms", "min ms"))
+    for name, command in _startupCommands(""):
+        r = report["startup"][name]
+        print ("%-36s %12.1f %12.1f" % (name, r["medianMs"], r["minMs"]))
+    if (not report["bytecode"]):
+        print ("Writing bytecode is disabled (PYTHONDONTWRITEBYTECODE), every module is compiled on each run.")
+
+
+def displayResults(report):
+    print ("%-36s %10s %12s %14s %12s" % ("stage", "lines", "seconds", "lines/sec", "peak KB"))
+    for stage in STAGES:
+        if (stage not in report["results"]):
+            continue
+        r = report["results"][stage]
+        print ("%-36s %10d %12.4f %14.0f %12s" % (stage, r["lines"], r["seconds"], r["linesPerSec"] or 0,
+                                                   r["peakMemoryKB"]))
+
+
+def compareResults(old, new, threshold=0.1):
+    '''
+        Prints the change of every measurement from old to new.
+    :return: number of measurements slower by more than threshold
+    '''
+    regressions = 0
+    if (old["parameters"] != new["parameters"]):
+        sys.stderr.write("The runs used different parameters, the comparison may not be meaningful.\n")
+    if ("startup" in old and "startup" in new):
+        print ("%-36s %14s %14s %8s" % ("command", "old median ms", "new median ms", "change"))
+        for name, command in _startupCommands(""):
+            if (name not in old["startup"] or name not in new["startup"]):
+                continue
+            before = old["startup"][name]["medianMs"]
+            after = new["startup"][name]["medianMs"]
+            change = after / before - 1
+            flag = ""
+            if (change > threshold):
+                flag = "  REGRESSION"
+                regressions += 1
+            print ("%-36s %14.1f %14.1f %+7.1f%%%s" % (name, before, after, change * 100, flag))
+        return regressions
+    print ("%-36s %14s %14s %8s" % ("stage", "old lines/sec", "new lines/sec", "change"))
+    for stage in STAGES:
+        if (stage not in old["results"] or stage not in new["results"]):
+            continue
+        before = old["results"][stage]["linesPerSec"]
+        after = new["results"][stage]["linesPerSec"]
+        if (not before or not after):
+            continue
+        change = after / before - 1
+        flag = ""
+        if (change < -threshold):
+            flag = "  REGRESSION"
+            regressions += 1
+        print ("%-36s %14.0f %14.0f %+7.1f%%%s" % (stage, before, after, change * 100, flag))
+    return regressions
+
+
+def _option(args, option, default, convert):
+    if (option not in args):
+        return default
+    index = args.index(option)
+    try:
+        return convert(args[index + 1])
+    except (IndexError, ValueError):
+        sys.stderr.write("Invalid value for " + option + "\n")
+        sys.exit(1)
+
+
+def main():
+    args = sys.argv[1:]
+    if ("--compare" in args):
+        index = args.index("--compare")
+        if (index + 2 >= args.__len__()):
+            sys.stderr.write("Usage: benchmark.py --compare OLD NEW [--threshold F]\n")
+            sys.exit(1)
+        with open(args[index + 1]) as f:
+            old = json.load(f)
+        with open(args[index + 2]) as f:
+            new = json.load(f)
+        if (compareResults(old, new, _option(args, "--threshold", 0.1, float)) > 0):
+            sys.exit(1)
+        return
+    if ("--startup" in args):
+        report = runStartup(_option(args, "--repeat", 20, int))
+        displayStartup(report)
+    else:
+        report = runBenchmarks(_parameters(args))
+        displayResults(report)
+    output = _option(args, "--output", None, str)
+    if (output is not None):
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+def _parameters(args):
+    parameters = dict(DEFAULT_PARAMETERS)
+    for name, convert in (("jobs", int), ("deps", float), ("directives", int), ("arrays", float), ("repeat", int),
+                          ("seed", int)):
+        parameters[name] = _option(args, "--" + name, parameters[name], convert)
+    parameters["memo"] = "--memo" in args
+    return parameters
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+'''
+IBM Spectrum LSF backend of script_scheduler_writer, see SCHEDULERS there for what a backend defines.
+'''
+
+import script_ir
+import script_scheduler_writer
+
+
+SPEC = {
+    "launcher": "bsub ",
+    "localLauncher": "",
+    "directive": "#BSUB ",
+    "module": None,
+    "taskId": "$LSB_JOBINDEX",
+    "barrier": "bsub {0}true",
+    "wrapper": "sh -c '{0}'",
+    "taskDependencies": False,
+    "keywords": {
+        "JOB_NAME": ("-J {0}", None),
+        "RESOURCE_NODES": ("-n {0}", None),
+        "RESOURCE_EXCLUSIVE": ("-x", None),
+        "JOB_ARRAY": ("-J \"{0}\"", None),  # name[tasks], see combineItems
+        "RESOURCE_MEM": ("-M {0}", script_scheduler_writer.memoryConversion("LSF")),
+        "RESOURCE_PRIOR": ("-q {0}", None),
+        "OUTPUT_CURRENT_DIR": ("-o %J.out", None),  # LSF emails the output of jobs without -o
+    },
+    "unavailable": {"RESOURCE_IB": False, "RESOURCE_CCM": True},
+    "standard": [],
+}
+
+
+def combineItems(items):
+    '''
+        LSF has no option for job arrays, the tasks are written in the job name: -J "name[1-10]".
+        The JOB_ARRAY of a command takes the argument of its JOB_NAME, which is then deleted.
+    :param items: the items of a command, see script_scheduler_writer.readCommand
+    :return: the items written by _writeCommand
+    '''
+    request = script_ir.ResourceRequest
+    name = None
+    tasks = None
+    for item in items:
+        if (item.__class__ is request):
+            if (item[0] == "JOB_NAME"):
+                name = item
+            elif (item[0] == "JOB_ARRAY"):
+                tasks = item
+    if (tasks is None):
+        return items
+    jobName = "array"
+    if (name is not None):
+        jobName = name[1][0]
+    array = request("JOB_ARRAY", (jobName + "[" + tasks[1][0].replace(":", "-", 1) + "]",))
+    return tuple([array if item is tasks else item for item in items if item is not name])
+
+
+def emailHeader(spec):
+    '''
+    :param spec: script_ir.EmailSpec, already checked for conflicting types
+    :return: the header lines
+    '''
+    email, type = spec.email, spec.type
+    header = "#BSUB -u "+email+"\n"
+    if (type != "" and type != "NEVER"):
+        type = type.split()
+        if ("ALWAYS" in type or "START" in type):
+            header += "#BSUB -B\n"
+        if ("ALWAYS" in type or "END" in type or "ABORT" in type):  # LSF sends one report when the job finishes
+            header += "#BSUB -N\n"
+    return header
+
+
+def dependencyOption(dependencyType, array):
+    '''
+    :param dependencyType: the dependency type of the job, without spaces
+    :param array: True if the job is an array, LSF makes no difference
+    :return: (option of bsub, separator of the jobs, end of the option)
+    '''
+    if (dependencyType == "OKAY"):
+        condition = "done"
+    elif (dependencyType == "NOTOKAY"):
+        condition = "exit"
+    elif (dependencyType == "START"):
+        condition = "started"
+    else:
+        condition = "ended"
+    return ("-w \"" + condition + "(", ") && " + condition + "(", ")\"")
@@ -0,0 +1,71 @@
+'''
+PBS Professional backend of script_scheduler_writer, see SCHEDULERS there for what a backend defines.
+Torque spells some of these options differently (-t for arrays, -l nodes=N, $PBS_ARRAYID), the ones here are PBS Pro's.
+'''
+
+import script_scheduler_writer
+
+
+SPEC = {
+    "launcher": "qsub ",
+    "localLauncher": "",
+    "directive": "#PBS ",
+    "module": None,
+    "taskId": "$PBS_ARRAY_INDEX",
+    "barrier": "qsub {0}-- /bin/true",
+    "wrapper": "-- /bin/sh -c '{0}'",
+    "taskDependencies": False,
+    "jobId": r"[0-9]+(\[[0-9]*\])?(\.[A-Za-z0-9_.-]+)?",  # 123[].server for a job array, which depend= needs as it is
+    "keywords": {
+        "JOB_NAME": ("-N {0}", None),
+        "RESOURCE_NODES": ("-l select={0}", None),
+        "RESOURCE_EXCLUSIVE": ("-l place=excl", None),
+        "JOB_ARRAY": ("-J {0}", lambda tasks: tasks.replace(":", "-", 1)),
+        "RESOURCE_MEM": ("-l mem={0}", script_scheduler_writer.memoryConversion("PBS", lambda mem: mem.lower())),
+        "RESOURCE_PRIOR": ("-q {0}", None),
+        "OUTPUT_CURRENT_DIR": ("", None),  # ignore, PBS writes the output files where the job was submitted
+    },
+    "unavailable": {"RESOURCE_IB": False, "RESOURCE_CCM": True},
+    "standard": [],
+}
+
+
+def emailHeader(spec):
+    '''
+    :param spec: script_ir.EmailSpec, already checked for conflicting types
+    :return: the header lines
+    '''
+    email, type = spec.email, spec.type
+    header = "#PBS -M "+email+"\n"
+    if (type == "NEVER"):
+        header += "#PBS -m n\n"
+    elif (type != ""):
+        type = type.split()
+        if ("ALWAYS" in type):
+            header += "#PBS -m abe\n"
+        else:
+            mailTypes = ""
+            if ("START" in type):
+                mailTypes += "b"
+            if ("END" in type):
+                mailTypes += "e"
+            if ("ABORT" in type):
+                mailTypes += "a"
+            if (mailTypes != ""):  # PBS sends no email on suspension
+                header += "#PBS -m " + mailTypes + "\n"
+    return header
+
+
+def dependencyOption(dependencyType, array):
+    '''
+    :param dependencyType: the dependency type of the job, without spaces
+    :param array: True if the job is an array, PBS makes no difference
+    :return: (option of qsub, separator of the jobs, end of the option)
+    '''
+    if (dependencyType == "OKAY"):
+        return ("-W depend=afterok:", ":", "")
+    elif (dependencyType == "NOTOKAY"):
+        return ("-W depend=afternotok:", ":", "")
+    elif (dependencyType == "START"):
+        return ("-W depend=after:", ":", "")
+    return ("-W depend=afterany:", ":", "")
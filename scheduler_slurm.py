@@ -0,0 +1,184 @@
+'''
+Slurm backend of script_scheduler_writer, see SCHEDULERS there for what a backend defines.
+'''
+
+import re
+import script_scheduler_writer
+
+_ARRAY_RANGE = re.compile(r"(\d+)(?:-(\d+)(?::(\d+))?)?$")  # N, N-M or N-M:S
+
+
+def _memToStandard(mem):
+    '''
+    :param mem: size with an optional unit, K, M (the default), G or T
+    :return: the size in MB or GB, as the standard syntax expects. 0, all the memory of the node, stays 0
+    '''
+    units = {"K": 1.0 / 1024, "M": 1, "G": 1024, "T": 1024 * 1024}
+    number = mem.rstrip("KMGTBkmgtb")
+    unit = mem[number.__len__():].upper().replace("B", "") or "M"
+    if (not number.isdigit() or unit not in units):
+        return mem
+    size = int(number) * units[unit]
+    if (size == 0):
+        return "0"
+    if (size >= 1024 and size % 1024 == 0):
+        return str(int(size) // 1024) + "GB"
+    return str(max(int(size), 1)) + "MB"
+
+
+def _arrayToStandard(tasks):
+    '''
+    :param tasks: --array argument: N, N-M, N-M:S, or a list of them separated by commas
+    :return: the tasks as N1:N2 or N1:N2:S, as the standard syntax expects. Raises UnknownDirective for tasks that
+             are not evenly spaced, or with a limit of tasks running at once (%N), which the standard syntax cannot hold.
+    '''
+    parts = []
+    for part in tasks.split(","):
+        match = _ARRAY_RANGE.match(part)
+        if (match is None):
+            parts = None
+            break
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        step = int(match.group(3) or 1)
+        if (last < first or step < 1):
+            parts = None
+            break
+        parts.append((first, last, step))
+    if (parts is not None and parts.__len__() > 1):  # a list, fine if its tasks are a single evenly spaced range
+        numbers = sorted(set([x for first, last, step in parts for x in range(first, last + 1, step)]))
+        step = 1
+        if (numbers.__len__() > 1):
+            step = numbers[1] - numbers[0]
+        parts = [(numbers[0], numbers[-1], step)]
+        if (numbers != range(numbers[0], numbers[-1] + 1, step)):
+            parts = None
+    if (parts is None):
+        raise script_scheduler_writer.UnknownDirective("Job array \"" + tasks + "\" cannot be translated, only an evenly "
+                                                       "spaced range of tasks is supported, without %.", tasks)
+    first, last, step = parts[0]
+    if (step == 1 or first == last):
+        return str(first) + ":" + str(last)
+    return str(first) + ":" + str(last) + ":" + str(step)
+
+
+def _mailTypeToStandard(types):
+    '''
+    :param types: --mail-type argument, e.g. BEGIN,END
+    :return: the email types of the standard syntax, see script_scheduler_writer.addEmail
+    '''
+    types = types.upper().split(",")
+    if ("ALL" in types):
+        return "ALWAYS"
+    if ("NONE" in types):
+        return "NEVER"
+    standard = []
+    if ("BEGIN" in types):
+        standard.append("START")
+    if ("END" in types):
+        standard.append("END")
+    if ("FAIL" in types):
+        standard.append("ABORT")
+    return " ".join(standard)
+
+
+SPEC = {
+    "launcher": "sbatch ",
+    "localLauncher": "srun ",
+    "directive": "#SBATCH ",
+    "module": None,
+    "taskId": "$SLURM_ARRAY_TASK_ID",
+    "barrier": "sbatch {0}--wrap=true",
+    "wrapper": "--wrap='{0}'",
+    "taskDependencies": ("OKAY",),  # aftercorr: each task waits for the same task of the other arrays to succeed
+    "keywords": {
+        "JOB_NAME": ("--job-name={0}", None),
+        "RESOURCE_NODES": ("-N {0}", None),
+        "RESOURCE_EXCLUSIVE": ("--exclusive", None),
+        "JOB_ARRAY": ("--array={0}", lambda tasks: tasks.replace(":", "-", 1)),
+        "RESOURCE_MEM": ("--mem={0}", None),
+        "RESOURCE_CCM": ("-ccm", None),
+        "RESOURCE_PRIOR": ("--qos={0}", None),
+        "OUTPUT_CURRENT_DIR": ("", None),  # ignore, this is the default in SLURM
+    },
+    "unavailable": {"RESOURCE_IB": False},
+    "standard": [],
+    # reading scripts of Slurm, see translator._parseOptions
+    "joinedArguments": True,
+    "options": {
+        "--job-name": ("JOB_NAME", True, None),
+        "-J": ("JOB_NAME", True, None),
+        "--nodes": ("RESOURCE_NODES", True, None),
+        "-N": ("RESOURCE_NODES", True, None),
+        "--exclusive": ("RESOURCE_EXCLUSIVE", False, None),
+        "--array": ("JOB_ARRAY", True, _arrayToStandard),
+        "-a": ("JOB_ARRAY", True, _arrayToStandard),
+        "--mem": ("RESOURCE_MEM", True, _memToStandard),
+        "--qos": ("RESOURCE_PRIOR", True, None),
+        "-q": ("RESOURCE_PRIOR", True, None),
+        "--ccm": ("RESOURCE_CCM", False, None),
+        "-ccm": ("RESOURCE_CCM", False, None),
+        "--dependency": ("DEPEND", True, None),
+        "-d": ("DEPEND", True, None),
+        "--mail-user": ("EMAIL", True, None),
+        "--mail-type": ("EMAIL_TYPE", True, _mailTypeToStandard),
+        "--parsable": ("", False, None),  # the id of the job is taken from the output of sbatch either way
+    },
+    # options without a standard keyword, known only to find the script after their argument
+    "unsupported": ["--account", "-A", "--begin", "-b", "--chdir", "-D", "--comment", "--constraint", "-C",
+                    "--cpus-per-task", "-c", "--error", "-e", "--exclude", "-x", "--export", "--gres", "--input", "-i",
+                    "--licenses", "-L", "--mem-per-cpu", "--nodelist", "-w", "--ntasks", "-n", "--ntasks-per-node",
+                    "--output", "-o", "--partition", "-p", "--reservation", "--signal", "--time", "-t", "--wrap"],
+    "dependencyTypes": {
+        "after": ("START", False),
+        "afterany": ("", False),
+        "afterok": ("OKAY", False),
+        "afternotok": ("NOT OKAY", False),
+        "aftercorr": ("OKAY", True),
+    },
+    "taskIds": ["$SLURM_ARRAY_TASK_ID", "$SLURM_TASK_ID"],
+}
+
+
+def emailHeader(spec):
+    '''
+    :param spec: script_ir.EmailSpec, already checked for conflicting types
+    :return: the header lines
+    '''
+    email, type = spec.email, spec.type
+    header = "#SBATCH --mail-user="+email+"\n"
+    header += "#SBATCH --mail-type="
+    if(type == "NEVER" or type == ""):
+        header += "NONE\n"
+    else:
+        type = type.split()
+        if ("ALWAYS" in type):
+            header += "ALL\n"
+        else:
+            mailTypes = []
+            if ("START" in type):
+                mailTypes.append("BEGIN")
+            if ("END" in type):
+                mailTypes.append("END")
+            if ("ABORT" in type or "SUSPENDED" in type):
+                mailTypes.append("FAIL")
+            header += ",".join(mailTypes) + "\n"
+    return header
+
+
+def dependencyOption(dependencyType, array):
+    '''
+    :param dependencyType: the dependency type of the job, without spaces
+    :param array: True if the tasks of the job depend on the same tasks of the other jobs. Slurm only has that for
+                  jobs ending successfully (aftercorr), see taskDependencies.
+    :return: (option of sbatch, separator of the jobs, end of the option)
+    '''
+    if (array and dependencyType == "OKAY"):
+        return ("--dependency=aftercorr:", ":", "")
+    if (dependencyType == "OKAY"):
+        return ("--dependency=afterok:", ":", "")
+    elif (dependencyType == "NOTOKAY"):
+        return ("--dependency=afternotok:", ":", "")
+    elif (dependencyType == "START"):
+        return ("--dependency=after:", ":", "")
+    return ("--dependency=afterany:", ":", "")
@@ -0,0 +1,139 @@
+'''
+Univa Grid Engine backend of script_scheduler_writer, see SCHEDULERS there for what a backend defines.
+'''
+
+import script_ir
+import script_scheduler_writer
+
+
+def _resourceToStandard(resource):
+    '''
+    :param resource: -l argument
+    :return: the standard keyword of the resource, RESOURCE_PRIOR for the resources that have none
+    '''
+    if (resource.startswith("ram.c=")):
+        return script_ir.ResourceRequest("RESOURCE_MEM", (resource[len("ram.c="):],))
+    elif (resource == "infiniband.c=1"):
+        return script_ir.ResourceRequest("RESOURCE_IB")
+    elif (resource == "exclusive.c"):
+        return script_ir.ResourceRequest("RESOURCE_EXCLUSIVE")
+    return resource
+
+
+def _slotsToStandard(environment, slots):
+    '''
+    :return: the slots of -pe pe_slots, None for other parallel environments
+    '''
+    if (environment == "pe_slots"):
+        return slots
+    return None
+
+
+def _mailTypeToStandard(types):
+    '''
+    :param types: -m argument, e.g. be
+    :return: the email types of the standard syntax, see script_scheduler_writer.addEmail
+    '''
+    if (types == "n"):
+        return "NEVER"
+    if ("a" in types and "e" in types):
+        return "ALWAYS"
+    standard = []
+    if ("b" in types):
+        standard.append("START")
+    if ("e" in types):
+        standard.append("END")
+    if ("a" in types):
+        standard.append("ABORT")
+    if ("s" in types):
+        standard.append("SUSPENDED")
+    return " ".join(standard)
+
+
+SPEC = {
+    "launcher": "qsub ",
+    "localLauncher": "",
+    "directive": "#$ ",
+    "module": "uge",
+    "taskId": "$SGE_TASK_ID",
+    "barrier": "qsub -b y {0}true",
+    "wrapper": "-b y sh -c '{0}'",
+    "taskDependencies": True,  # -hold_jid_ad: each task waits for the same task of the other arrays, for any type
+    "keywords": {
+        "JOB_NAME": ("-N {0}", None),
+        "RESOURCE_NODES": ("-pe pe_slots {0}", None),
+        "RESOURCE_IB": ("-l infiniband.c=1", None),
+        "RESOURCE_EXCLUSIVE": ("-l exclusive.c", None),
+        "JOB_ARRAY": ("-t {0}", None),
+        "RESOURCE_MEM": ("-l ram.c={0}", script_scheduler_writer.memoryConversion(
+            "UGE", lambda mem: mem.replace("MB", "M").replace("GB", "G"))),
+        "RESOURCE_PRIOR": ("-l {0}", None),
+        "OUTPUT_CURRENT_DIR": ("-cwd", None),
+    },
+    "unavailable": {"RESOURCE_CCM": True},
+    "standard": [
+        ("-N ", "JOB_NAME "),
+        ("-pe pe_slots ", "RESOURCE_NODES "),
+        ("-l infiniband.c=1", "RESOURCE_IB"),
+        ("-l exclusive.c", "RESOURCE_EXCLUSIVE"),
+        ("-t ", "JOB_ARRAY "),
+        ("$SGE_TASK_ID", "TASK_ID"),
+        ("-l ram.c=", "RESOURCE_MEM "),
+        ("-l", "RESOURCE_PRIOR"),  # any other resource, must come after the specific ones
+    ],
+    # reading the qsub lines and #$ lines of Grid Engine scripts, see translator._parseOptions
+    "options": {
+        "-N": ("JOB_NAME", True, None),
+        "-pe": ("RESOURCE_NODES", 2, _slotsToStandard),
+        "-l": ("RESOURCE_PRIOR", True, _resourceToStandard),
+        "-t": ("JOB_ARRAY", True, None),
+        "-cwd": ("OUTPUT_CURRENT_DIR", False, None),
+        "-hold_jid": ("DEPEND", True, None),
+        "-hold_jid_ad": ("DEPEND_ARRAY", True, None),
+        "-M": ("EMAIL", True, None),
+        "-m": ("EMAIL_TYPE", True, _mailTypeToStandard),
+    },
+    # options without a standard keyword, known only to find the script after them
+    "unsupported": ["-A", "-a", "-ac", "-b", "-ckpt", "-dc", "-dl", "-e", "-i", "-j", "-jc", "-js", "-now", "-o", "-P",
+                    "-p", "-q", "-R", "-r", "-S", "-shell", "-sync", "-tc", "-v", "-w", "-wd"],
+    "flags": ["-terse", "-V", "-notify", "-hard", "-soft", "-clear"],
+    "taskIds": ["$SGE_TASK_ID"],
+}
+
+
+def emailHeader(spec):
+    '''
+    :param spec: script_ir.EmailSpec, already checked for conflicting types
+    :return: the header lines
+    '''
+    email, type = spec.email, spec.type
+    header = "#$ -M "+email+"\n"
+    if (type == "NEVER"):
+        header += "#$ -m n\n"
+    elif (type != ""):
+        type = type.split()
+        if ("ALWAYS" in type):
+            header += "#$ -m beas\n"
+        else:
+            header += "#$ -m "
+            if ("START" in type):
+                header += "b"
+            if ("END" in type):
+                header += "e"
+            if ("ABORT" in type):
+                header += "a"
+            if ("SUSPENDED" in type):
+                header += "s"
+            header += "\n"
+    return header
+
+
+def dependencyOption(dependencyType, array):
+    '''
+    :param dependencyType: the dependency type of the job, without spaces. Grid Engine only waits for jobs to end.
+    :param array: True if the tasks of the job depend on the same tasks of the other jobs
+    :return: (option of qsub, separator of the jobs, end of the option)
+    '''
+    if (array):
+        return ("-hold_jid_ad ", ",", "")
+    return ("-hold_jid ", ",", "")
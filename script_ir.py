@@ -0,0 +1,86 @@
+'''
+Intermediate representation of the items of a script, shared by the input parsers and the scheduler backends.
+
+The parsers of the standard syntax (script_scheduler_writer.readCommand, readDependency) and of the input schedulers
+(translate_script) produce these objects, and the writer hands them to the backend of the output scheduler, so an input
+format reaches every output format without going through the text of another one.
+'''
+
+import operator
+
+
+class ResourceRequest(tuple):
+    '''
+        A keyword of the standard syntax in a command, with its arguments, e.g. RESOURCE_NODES 4.
+        It is a (keyword, args) tuple, like a namedtuple, so that reading a command allocates no more than the tuple.
+    '''
+    __slots__ = ()
+
+    def __new__(cls, keyword, args=()):
+        return tuple.__new__(cls, (keyword, args))  # args: tuple of words
+
+    keyword = property(operator.itemgetter(0))
+    args = property(operator.itemgetter(1))
+
+    def __repr__(self):
+        return "ResourceRequest(" + repr(self[0]) + ", " + repr(self[1]) + ")"
+
+
+class Dependency(object):
+    '''
+        The jobs a job depends on.
+    '''
+    __slots__ = ("kind", "jobs", "array", "type")
+
+    def __init__(self, kind, jobs, array=False, type=""):
+        self.kind = kind  # "JOB_NUM" for jobs of the script, by number starting at 1, "JOB_ID" for ids of other jobs
+        self.jobs = jobs  # range or array of job numbers, tuple of ids
+        self.array = array  # True if the tasks of the job depend on the same tasks of the other jobs
+        self.type = type  # "OKAY", "START"... see script_scheduler_writer.addJob, "" to wait for the jobs to end
+
+    def __repr__(self):
+        return "Dependency(" + ", ".join([repr(self.kind), repr(self.jobs), repr(self.array), repr(self.type)]) + ")"
+
+
+class Job(object):
+    '''
+        A job launched by the script.
+    '''
+    __slots__ = ("command", "dependency", "prefix")
+
+    def __init__(self, command, dependency=None, prefix=None):
+        # the launch command in the standard syntax, see script_scheduler_writer.addJob, or the tuple of ResourceRequest
+        # and runs of other words of a command already read by an input parser, see script_scheduler_writer.readCommand
+        self.command = command
+        self.dependency = dependency  # Dependency, or None
+        self.prefix = prefix  # for a tuple, the text of the line before the launcher, None for a launch command
+
+    def __repr__(self):
+        return "Job(" + ", ".join([repr(self.command), repr(self.dependency), repr(self.prefix)]) + ")"
+
+
+class EmailSpec(object):
+    '''
+        Who gets emails about the jobs, and when.
+    '''
+    __slots__ = ("email", "type")
+
+    def __init__(self, email, type=""):
+        self.email = email
+        self.type = type  # see script_scheduler_writer.addEmail
+
+    def __repr__(self):
+        return "EmailSpec(" + repr(self.email) + ", " + repr(self.type) + ")"
+
+
+class DefaultConfig(object):
+    '''
+        Options applied to every job of the script, written as directives in the header.
+    '''
+    __slots__ = ("items",)
+
+    def __init__(self, items=()):
+        self.items = items  # tuple of ResourceRequest and runs of other words, see script_scheduler_writer.readCommand
+
+    def __repr__(self):
+        return "DefaultConfig(" + repr(self.items) + ")"
@@ -11,19 +11,588 @@ Functions whose names start with underscore should not be directly accessed by t
 '''
 
 import sys
+import re
+import array
+import bisect
+import collections
+import script_ir
+try:
+    from thread import allocate_lock  # lighter to import than threading
+except ImportError:
+    from _thread import allocate_lock
+
+# Everything that changes from one scheduler to another lives in the module of its backend, imported only when a
+# writer uses the scheduler. To support a new scheduler, write its module and add it here (or call registerScheduler).
+# A backend module defines:
+#   SPEC, a dictionary with:
+#     launcher, localLauncher: replace LAUNCH and RUN in job lines
+#     directive: prefix of the default configuration lines
+#     module: module loaded by scripts written for the scheduler, or None
+#     taskId: variable holding the task id of an array job, replaces TASK_ID
+#     barrier: command submitting a job that does nothing, {0} is replaced with its dependencies, see _getBarriers
+#     wrapper: launcher option running the command {0} as the job, see _JobArray
+#     taskDependencies: dependency types (without spaces) whose array dependencies can be task by task, True for every
+#                       type, see _getDependencyString
+#     keywords: translation of the keywords of STANDARD_KEYWORDS, see _writeCommand.
+#         keyword: (replacement formatted with the arguments, argument conversion)
+#     unavailable: keyword: True if the translation must stop, False if the keyword is just deleted
+#     standard: (scheduler option, standard keyword) in the order they are tried when reading a script of this
+#               scheduler
+#     jobId: optional, awk regular expression of the id of a job in the output of the launcher, see _getJobIdLine
+#     options, unsupported, flags, joinedArguments, dependencyTypes, taskIds: optional, for reading scripts of the
+#                                                                       scheduler, see translator._parseOptions
+#       options: option of the launcher: (standard keyword, number of arguments (True for one), argument conversion).
+#                The conversion may return a script_ir.ResourceRequest instead, for options standing for several
+#                keywords, or None for arguments that have no standard keyword
+#       unsupported: options of the launcher taking an argument that have no standard keyword
+#       flags: options of the launcher without an argument that have no standard keyword
+#       joinedArguments: True if the launcher also reads --option=argument and -Oargument
+#       dependencyTypes: dependency type of the launcher: (standard dependency type, True if it is by task)
+#       taskIds: variables holding the task id of an array job
+#   emailHeader(spec): header lines of a script_ir.EmailSpec, see addEmailSpec
+#   dependencyOption(dependencyType, array): (launcher option, separator of the jobs, end of the option) of
+#                                            _formatDependencies
+#   combineItems(items): optional, the items of a command written as fewer items, for options of the scheduler
+#                        holding more than one keyword, see _writeCommand
+SCHEDULERS = collections.OrderedDict([
+    ("UGE", "scheduler_uge"),
+    ("SLURM", "scheduler_slurm"),
+    ("PBS", "scheduler_pbs"),
+    ("LSF", "scheduler_lsf"),
+])
+
+# keyword of the standard syntax: (arguments, arguments deleted with a repeated keyword), see readCommand
+STANDARD_KEYWORDS = {
+    "JOB_NAME": (1, 1),
+    "RESOURCE_NODES": (1, 1),
+    "RESOURCE_IB": (0, 0),
+    "RESOURCE_EXCLUSIVE": (0, 0),
+    "JOB_ARRAY": (1, 1),
+    "RESOURCE_MEM": (1, 1),
+    "RESOURCE_CCM": (0, 0),
+    "RESOURCE_PRIOR": (1, 1),
+    "OUTPUT_CURRENT_DIR": (0, 1),
+}
+
+
+class TranslationError(Exception):
+    '''
+        Base class of the errors raised on bad input. Nothing in the library exits the interpreter, the command line
+        interface maps these errors to exitCode.
+    :param token: the word of the input responsible for the error, if any
+    :param line: number of the line of the input, set by the translator
+    '''
+    exitCode = 1
+    def __init__(self, message, token=None, line=None):
+        Exception.__init__(self, message)
+        self.message = message
+        self.token = token
+        self.line = line
+    def __str__(self):
+        if (self.line is None):
+            return self.message
+        return "line " + str(self.line) + ": " + self.message
+
+
+class UnsupportedScheduler(TranslationError):
+    exitCode = 2
+
+
+class UnknownDirective(TranslationError):
+    '''
+        A command of the standard syntax or an option of the input scheduler that cannot be translated.
+    '''
+    exitCode = 3
+
+
+class InvalidDependency(TranslationError):
+    exitCode = 4
+
+
+class UnavailableKeyword(TranslationError):
+    '''
+        A keyword that has no translation for the output scheduler and cannot be ignored.
+    '''
+    exitCode = 5
+
+
+class ConflictingEmailTypes(TranslationError):
+    exitCode = 6
+
+
+_JOB_ID = "[0-9]+"  # the first number in the output of the launcher, see _getJobIdLine
+
+
+class _SchedulerTable:
+    '''
+        Compiled form of a backend of SCHEDULERS. It is built once per scheduler and shared by every writer and
+        translator.
+    '''
+    def __init__(self, name, backend):
+        spec = backend.SPEC
+        self.name = name
+        self.emailHeader = backend.emailHeader
+        self.dependencyOption = backend.dependencyOption
+        self.combineItems = getattr(backend, "combineItems", None)
+        self.launcher = spec["launcher"]
+        self.localLauncher = spec["localLauncher"]
+        self.directive = spec["directive"]
+        self.module = spec["module"]
+        self.taskId = spec["taskId"]
+        self.barrier = spec["barrier"]
+        self.wrapper = spec["wrapper"]
+        self.taskDependencies = spec["taskDependencies"]
+        if (self.taskDependencies is not True):
+            self.taskDependencies = frozenset(self.taskDependencies or ())
+        self.jobId = spec.get("jobId", _JOB_ID)
+        # keyword: (replacement, conversion, unavailable)
+        # unavailable is None for translated keywords, otherwise True if the translation must stop
+        self.words = {}
+        for keyword, (replacement, convert) in spec["keywords"].items():
+            self.words[keyword] = (replacement, convert, None)
+        for keyword, fatal in spec["unavailable"].items():
+            self.words[keyword] = ("", None, fatal)
+        self.standard = spec["standard"]
+        self.standardRegex = None
+        if (self.standard):
+            self.standardRegex = re.compile("|".join([re.escape(option) for option, keyword in self.standard]))
+        self.options = dict.fromkeys(spec.get("unsupported", ()), (None, True, None))
+        self.options.update(dict.fromkeys(spec.get("flags", ()), (None, False, None)))
+        self.joinedArguments = spec.get("joinedArguments", False)
+        self.options.update(spec.get("options", {}))
+        self.dependencyTypes = spec.get("dependencyTypes", {})
+        self.taskIdRegex = None  # $VARIABLE or ${VARIABLE} of each of taskIds, not followed by more of a name
+        if (spec.get("taskIds")):
+            names = "|".join([re.escape(x.lstrip("$")) for x in spec["taskIds"]])
+            self.taskIdRegex = re.compile(r"\$(?:(?:" + names + r")(?!\w)|\{(?:" + names + r")\})")
+
+    def toStandard(self, command):
+        '''
+            Replaces the first occurrence of every option in the "standard" list with its standard keyword, in one scan.
+        '''
+        if (self.standardRegex is None):
+            return command
+        used = set()
+
+        def replace(match):
+            text = match.group(0)
+            # the longest option is tried first, if it was already replaced a shorter one may still apply
+            for option, keyword in self.standard:
+                if (option not in used and text.startswith(option)):
+                    used.add(option)
+                    return keyword + text[len(option):]
+            return text
+        return self.standardRegex.sub(replace, command)
+
+
+_tables = {}
+
+try:
+    _range = xrange  # ranges of jobs are kept without expanding them
+except NameError:
+    _range = range
+
+
+def _jobNumber(dependency, position):
+    '''
+    :param dependency: the words of a dependency, see readDependency
+    :return: the number at position, InvalidDependency if it is missing or not a number
+    '''
+    if (position >= dependency.__len__()):
+        raise InvalidDependency("Dependency \"" + " ".join(dependency) + "\" is missing a number of jobs.",
+                                " ".join(dependency))
+    try:
+        return int(dependency[position])
+    except ValueError:
+        raise InvalidDependency("Invalid number \"" + dependency[position] + "\" in dependency \"" +
+                                " ".join(dependency) + "\".", dependency[position])
+
+
+def itemsToStandard(items):
+    '''
+    :param items: the items of a command, see script_scheduler_writer.readCommand
+    :return: the command in the standard syntax
+    '''
+    request = script_ir.ResourceRequest
+    words = []
+    for item in items:
+        if (item.__class__ is request):
+            words.append(item[0])
+            words.extend(item[1])
+        else:
+            words.append(item)
+    return " ".join(words)
+
+
+def firstItems(items):
+    '''
+    :param items: the items of a command, see script_scheduler_writer.readCommand
+    :return: the items without the keywords found again, which readCommand deletes along with their arguments
+    '''
+    request = script_ir.ResourceRequest
+    found = set()
+    kept = []
+    for item in items:
+        if (item.__class__ is request):
+            if (item[0] in found):
+                continue
+            found.add(item[0])
+        kept.append(item)
+    return tuple(kept)
+
+
+def memoryConversion(scheduler, convert=None):
+    '''
+        Conversion of the argument of RESOURCE_MEM for a scheduler that cannot ask for all the memory of the node,
+        which RESOURCE_MEM 0 does (--mem=0 in Slurm).
+    :param convert: conversion of the other sizes, or None
+    :return: the conversion, raising UnavailableKeyword for 0
+    '''
+    def conversion(mem):
+        number = mem.rstrip("KMGTBkmgtb")
+        if (number.isdigit() and int(number) == 0):
+            raise UnavailableKeyword("RESOURCE_MEM 0 (all the memory of the node) not available for " + scheduler + ".",
+                                     mem)
+        if (convert is None):
+            return mem
+        return convert(mem)
+    return conversion
+
+
+class _JobLine(object):
+    '''
+        Job of the script, waiting in script_scheduler_writer.commands to be written. Its lines, with the dependency
+        list expanded, are only built when the script is written, so a job costs this record, its command and its
+        dependency. Only the dependency, shared with script_scheduler_writer.graph, is kept once the job is written.
+    '''
+    __slots__ = ("job", "launcher", "command", "dependency")
+
+    def __init__(self, job, launcher, command, dependency):
+        self.job = job  # number of the job in script_scheduler_writer.graph
+        self.launcher = launcher
+        self.command = command  # the options and command, already translated
+        self.dependency = dependency  # script_ir.Dependency, or None
+
+
+class _JobArray(object):
+    '''
+        Run of consecutive jobs with the same options and dependencies, whose commands only differ in one argument,
+        submitted as a single job array (see script_scheduler_writer.collapseArrays). Task i runs the command with the
+        i-th value of the argument, taken from a table inside the command, since the tasks cannot see the variables
+        of the script. The command runs through the wrapper of the scheduler, so it does not have to be a script.
+        Each job of the run keeps its number, and its variable holds the id of the array.
+    '''
+    __slots__ = ("job", "dependency", "options", "program", "position", "values")
+
+    def __init__(self, jobLine, options, program, position, values):
+        self.job = jobLine.job  # number of the first job of the run
+        self.dependency = jobLine.dependency
+        self.options = options  # tuple of script_ir.ResourceRequest
+        self.program = program  # words of the command of the first job
+        self.position = position  # position in program of the argument that changes
+        self.values = values  # the argument of each job, in order
+
+
+_SHELL_WORD = re.compile(r"[A-Za-z0-9_./:=,+@%-]+$")  # words that mean the same quoted or not, in any shell
+
+
+class DependencyGraph:
+    '''
+        Jobs of a script and the jobs each one depends on, built while the jobs are added.
+        Jobs are numbered in the order they are added, so a job may only depend on jobs with smaller numbers. That
+        order is topological: an edge to the job itself or to a later job is the only way to close a cycle, and it
+        is a forward reference in the script anyway, since the variable holding the id of the job is not set yet.
+        Checking every edge as it is added validates the whole graph in linear time.
+        The dependencies are kept as the writer stores them (ranges, arrays of job numbers), without expanding them.
+        For each job, [low, high] is an interval of its ancestors, used by reducedDependencies to skip whole runs of
+        implied edges at once (for a chain, every earlier job).
+    '''
+    def __init__(self):
+        self.parents = [()]  # by job number, job 0 does not exist
+        self.low = array.array("i", [0])
+        self.high = array.array("i", [-1])
+
+    def __len__(self):
+        return self.parents.__len__() - 1
+
+    def addJob(self, parents):
+        '''
+        :param parents: job numbers the new job depends on, a range, an array or any sequence
+        :return: the number of the new job
+        Raises InvalidDependency for a dependency on a job that does not exist yet, or before the first job.
+        '''
+        job = self.parents.__len__()
+        if (parents.__len__() > 0):
+            if (isinstance(parents, _range)):
+                first, last = parents[0], parents[-1]
+            else:
+                first, last = min(parents), max(parents)
+            if (last >= job):
+                raise InvalidDependency("Job " + str(job) + " cannot depend on job " + str(last) + ", jobs can only "
+                                        "depend on jobs added before them.", str(last))
+            if (first < 1):
+                raise InvalidDependency("Job " + str(job) + " depends on job " + str(first) + ", before the first job.",
+                                        str(first))
+        low, high = self._ancestorInterval(parents)
+        self.parents.append(parents)
+        self.low.append(low)
+        self.high.append(high)
+        return job
+
+    def truncate(self, length):
+        '''
+            Removes the jobs after the first length ones, for a job whose command was rejected after it was added.
+        '''
+        del self.parents[length + 1:]
+        del self.low[length + 1:]
+        del self.high[length + 1:]
+
+    def _ancestorInterval(self, parents):
+        '''
+        :return: (low, high), every job from low to high is an ancestor of a job with these parents. Empty if low > high
+        '''
+        if (parents.__len__() == 0):
+            return (0, -1)
+        if (isinstance(parents, _range)):
+            low = parents[0]
+            high = parents[-1]
+            for job in (parents[0], parents[-1]):  # the inner jobs are not looked at, so that ranges cost O(1)
+                if (self.high[job] >= low - 1 and self.low[job] < low):
+                    low = self.low[job]
+            return (low, high)
+        jobs = sorted(set(parents), reverse=True)
+        high = jobs[0]
+        low = high
+        for job in jobs:
+            if (job < low - 1):
+                break
+            low = min(low, job)
+            if (self.high[job] >= low - 1 and self.low[job] < low):
+                low = self.low[job]
+        return (low, high)
+
+    def isAncestor(self, ancestor, job, visited=None):
+        '''
+        :return: True if job depends, directly or not, on ancestor
+        '''
+        if (visited is None):
+            visited = set()
+        stack = [job]
+        while (stack):
+            job = stack.pop()
+            if (self.low[job] <= ancestor <= self.high[job]):
+                return True
+            parents = self.parents[job]
+            if (isinstance(parents, _range)):
+                if (parents.__len__() == 0 or parents[-1] < ancestor):
+                    continue
+                if (parents[0] <= ancestor):
+                    return True
+                candidates = parents
+            else:
+                candidates = [x for x in parents if x >= ancestor]  # jobs before ancestor cannot depend on it
+                if (ancestor in candidates):
+                    return True
+            for x in candidates:
+                if (x not in visited):
+                    visited.add(x)
+                    stack.append(x)
+        return False
+
+    def reducedDependencies(self, job):
+        '''
+            Transitive reduction of the dependencies of job: the jobs it depends on that are not ancestors of another
+            one of them. Depending only on those is the same as depending on all of them.
+            The candidates are taken from the last one down, with the jobs known to be ancestors of the ones kept so
+            far. A job can only be an ancestor of a later one, so a candidate is kept if it is not known once every
+            known job after it has had its parents added, and each job of the graph is looked at once.
+        :return: sorted list of job numbers
+        '''
+        parents = self.parents[job]
+        kept = []
+        if (isinstance(parents, _range)):
+            if (parents.__len__() == 0):
+                return kept
+            candidate, first = parents[-1], parents[0]
+            nextCandidate = lambda x: x - 1
+        else:
+            candidates = sorted(set(parents))
+            if (not candidates):
+                return kept
+            candidate, first = candidates[-1], candidates[0]
+
+            def nextCandidate(x):
+                position = bisect.bisect_left(candidates, x)
+                if (position == 0):
+                    return first - 1
+                return candidates[position - 1]
+        reached = _JobIntervals()  # ancestors of the jobs kept, jobs before the first candidate do not matter
+        expanded = job - 1  # the known jobs after it have had their parents added
+        while (candidate >= first):
+            position = reached.find(candidate)
+            if (position < 0):
+                known = reached.highestUpTo(expanded)
+                while (known > candidate):
+                    expanded = known - 1
+                    reached.add(max(self.low[known], first), self.high[known])
+                    ancestors = self.parents[known]
+                    if (isinstance(ancestors, _range)):
+                        if (ancestors.__len__() > 0):
+                            reached.add(max(ancestors[0], first), ancestors[-1])
+                    else:
+                        for x in ancestors:
+                            if (x >= first):
+                                reached.add(x, x)
+                    known = reached.highestUpTo(expanded)
+                position = reached.find(candidate)
+            if (position >= 0):  # the whole run of known jobs is implied, skip it
+                candidate = nextCandidate(reached.lows[position])
+                continue
+            kept.append(candidate)
+            reached.add(candidate, candidate)
+            candidate = nextCandidate(candidate)
+        kept.reverse()
+        return kept
+
+
+class _JobIntervals:
+    '''
+        Set of job numbers kept as sorted, disjoint intervals, so that a run of jobs costs one interval.
+    '''
+    def __init__(self):
+        self.lows = []
+        self.highs = []
+
+    def find(self, job):
+        '''
+        :return: the position of the interval holding job, -1 if job is not in the set
+        '''
+        position = bisect.bisect_right(self.lows, job) - 1
+        if (position >= 0 and self.highs[position] >= job):
+            return position
+        return -1
+
+    def highestUpTo(self, job):
+        '''
+        :return: the highest job of the set that is not after job, 0 if there is none
+        '''
+        position = bisect.bisect_right(self.lows, job) - 1
+        if (position < 0):
+            return 0
+        return min(self.highs[position], job)
+
+    def add(self, low, high):
+        '''
+            Adds the jobs from low to high, merged with the intervals they overlap or touch.
+        '''
+        if (low > high):
+            return
+        start = bisect.bisect_left(self.highs, low - 1)
+        end = bisect.bisect_right(self.lows, high + 1)
+        if (start < end):
+            low = min(low, self.lows[start])
+            high = max(high, self.highs[end - 1])
+        self.lows[start:end] = [low]
+        self.highs[start:end] = [high]
+
+
+class LineMemo:
+    '''
+        Bounded memo of parsed lines, shared by every writer and translator of the process.
+        Each entry is (result, warnings), the warnings are written again whenever the entry is used. Lines raising
+        an error are not kept. When the memo is full the oldest entries are dropped first, so that a hit costs a
+        single dictionary lookup.
+    '''
+    def __init__(self, maxEntries):
+        self.maxEntries = maxEntries
+        self.entries = {}
+        self.order = collections.deque()
+        self.lock = allocate_lock()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, entry):
+        if (self.maxEntries <= 0):
+            return
+        with self.lock:
+            if (key in self.entries):
+                return
+            self.entries[key] = entry
+            self.order.append(key)
+            while (self.order.__len__() > self.maxEntries):
+                del self.entries[self.order.popleft()]
+
+    def setSize(self, maxEntries):
+        '''
+        :param maxEntries: number of lines kept, 0 disables the memo
+        '''
+        with self.lock:
+            self.maxEntries = maxEntries
+            while (self.order.__len__() > max(maxEntries, 0)):
+                del self.entries[self.order.popleft()]
+
+    def forget(self, scheduler):
+        '''
+            Drops the lines parsed for or from scheduler, the first item of their keys.
+        '''
+        with self.lock:
+            self.order = collections.deque([key for key in self.order if key[0] != scheduler])
+            self.entries = dict([(key, self.entries[key]) for key in self.order])
+
+
+lineMemo = LineMemo(10000)
+
+
+def setLineMemoSize(maxEntries):
+    '''
+        Sets the number of lines kept by the memo of _parseCommand, translator._parseUGECommand and
+        translator._parseOptions, 0 disables it.
+    '''
+    lineMemo.setSize(maxEntries)
+
+
+def getSchedulerTable(scheduler):
+    '''
+    :return: the compiled table of the scheduler, None for the standard syntax ("")
+    '''
+    if (scheduler == ""):
+        return None
+    table = _tables.get(scheduler)
+    if (table is None):
+        backend = SCHEDULERS[scheduler]
+        __import__(backend)
+        table = _SchedulerTable(scheduler, sys.modules[backend])
+        _tables[scheduler] = table
+    return table
+
+
+def registerScheduler(name, backend):
+    '''
+        Adds a scheduler, or replaces the backend of one. Writers created before do not support it.
+    :param backend: name of the module of the backend, see SCHEDULERS
+    '''
+    SCHEDULERS[name] = backend
+    _tables.pop(name, None)
+    lineMemo.forget(name)  # parsed with the previous backend
 
 class script_scheduler_writer:
     def __init__(self, scheduler, name = "Name"):
-        self.jobsType = []
-        self.dependencies = []
-        self.dependenciesType = [] #Types: NONE, JOB_NUM, JOB_ID as well as SINGLE or ARRAY.
-        self.header = ""
+        self.numJobs = 0  # jobs added so far, counting the lines added with addLineParsed
+        self.graph = DependencyGraph()  # the jobs and the ones they depend on, see DependencyGraph
+        self.reduceDependencies = False  # write only the dependencies not implied by others, see _getDependencyString
+        self.dependencyKind = None  # (dependencyType, array) of the first job depending on other jobs
+        self.mixedDependenciesFrom = None  # first job depending on other jobs with a different kind
+        self.maxDependencies = 1000  # longer lists of dependencies are split between barrier jobs, see _getBarriers
+        self.collapseArrays = False  # submit runs of jobs differing in one argument as a job array, see _JobArray
+        self.lastJob = None  # (last line of self.commands, options, program) while a job array can grow from it
+        self.header = [] # fragments, joined only when the script is written
         self.commands = []
         self.name = name
         self.shellSet = False
-        self.schedulersSupported = ["UGE","SLURM",""] # "" means run standard syntax, it wont parse the commands.
+        self.schedulersSupported = list(SCHEDULERS) + [""] # "" means run standard syntax, it wont parse the commands.
         self.defaultCommands = ""
-        self.defaultHeader = ""
+        self.defaultHeader = []
         self.modules = ""
         self._setScheduler(scheduler)
         self.ignoreUnkown = True # ignore unknown commands? if not, delete them.
@@ -38,41 +607,99 @@ class script_scheduler_writer:
         '''
         :return: the amount of jobs appended so far
         '''
-        return  self.jobsType.__len__()
+        return  self.numJobs
+    def getJobVariable(self, job):
+        '''
+        :param job: number of the job, starting at 1
+        :return: the variable holding the id of the job once the script runs
+        '''
+        return "$"+self.name+"_JOB_"+str(job)
     def getSchedulers(self):
         '''
         :return: the list of schedulers currently supported
         '''
         return self.schedulersSupported
-    def getScript(self):
+    def _iterHeader(self):
         '''
-        :return: The script string ready to be written to a file
+        :return: iterator over the fragments of the header (shell, email, default configuration and modules)
         '''
-        string = ""
         if (not self.shellSet):
-            self.setShell("")
-        string += self.header
-        string += self.defaultHeader +"\n"
-        string += self.modules +"\n"
+            yield "#!/bin/bash -l\n"  # same as setShell(""), without changing the script
+        for x in self.header:
+            yield x
+        for x in self.defaultHeader:
+            yield x
+        yield "\n"
+        yield self.modules +"\n"
+    def _iterCommands(self):
+        '''
+        :return: iterator over the commands, with the dependencies of the jobs expanded
+        '''
         for x in self.commands:
-            string += x
-        return string
+            if (isinstance(x, _JobLine)):
+                barriers = []
+                dependencies = self._getDependencyString(x.dependency, x.job, barriers)
+                for line in barriers:
+                    yield line
+                job = self.name + "_JOB_" + str(x.job)
+                yield job + "=`" + x.launcher + dependencies + " " + x.command + "`\n"
+                yield self._getJobIdLine(job)
+            elif (isinstance(x, _JobArray)):
+                for line in self._iterJobArray(x):
+                    yield line
+            else:
+                yield x
+    def _iterScript(self):
+        '''
+        :return: iterator over the fragments of the script, in order
+        '''
+        for x in self._iterHeader():
+            yield x
+        for x in self._iterCommands():
+            yield x
+    def getScript(self):
+        '''
+        :return: The script string ready to be written to a file
+        '''
+        return "".join(self._iterScript())
+    def writeTo(self, fileobj):
+        '''
+            Write the script to fileobj (a file, sys.stdout...) one fragment at a time, without building the whole string.
+        '''
+        for x in self._iterScript():
+            fileobj.write(x)
+    def writeHeader(self, fileobj):
+        '''
+            Write only the header to fileobj. Used with flushCommands to write a script while it is being built.
+        '''
+        for x in self._iterHeader():
+            fileobj.write(x)
+    def flushCommands(self, fileobj):
+        '''
+            Write the commands added so far to fileobj and remove them from the script.
+            Jobs added later can still depend on the ones written.
+        '''
+        for x in self._iterCommands():
+            fileobj.write(x)
+        self.commands = []
     def clearCommands(self):
         '''
             Clean all the commands set so far
         '''
         self.commands = []
-        self.jobsType = []
-        self.dependencies = []
-        self.dependenciesType = []
+        self.numJobs = 0
+        self.graph = DependencyGraph()
+        self.dependencyKind = None
+        self.mixedDependenciesFrom = None
+        self.lastJob = None
         self.defaultCommands = ""
     def clearAll(self):
         '''
             Clean all variables
         '''
-        self.defaultHeader = ""
+        self.defaultHeader = []
         self.clearCommands()
-        self.header = ""
+        self.header = []
         self.name = "Name"
         self._setScheduler("")
         self.ignoreUnkown = True
@@ -86,11 +713,11 @@ class script_scheduler_writer:
             Sets a scheduler for the script. See this file header for the names of schedulers supported.
         '''
         if (type not in self.schedulersSupported):
-            sys.stderr.write("Scheduler not supported.\n")
-            sys.exit(1)
+            raise UnsupportedScheduler("Scheduler not supported.", type)
         self.scheduler = type
-        if(type == "UGE"):
-            self.addModule("module load uge\n")
+        self.table = getSchedulerTable(type)
+        if (self.table is not None and self.table.module is not None):
+            self.addModule("module load " + self.table.module + "\n")
     def setShell(self,shell):
         '''
             Set shell used by the script
@@ -98,9 +725,9 @@ class script_scheduler_writer:
         if (shell != ""):
             shell = shell.replace("\n", "")  # removes any newline characters
             shell = shell.replace("#!", "")  # removes any #! characters
-            self.header = "#!"+shell+"\n" + self.header
+            self.header.insert(0, "#!"+shell+"\n")
         else:
-            self.header = "#!/bin/bash -l\n" + self.header
+            self.header.insert(0, "#!/bin/bash -l\n")
         self.shellSet = True
     def addModule(self,module):
         if (module == ""):
@@ -119,35 +746,65 @@ class script_scheduler_writer:
         '''
             Add command to launch a job to the script
         :param command: command to run if first word of command is RUN or launch otherwise (see parseCommand() and getLauncher())
-        :param dependency: "LAST_ADDED", "LAST n" (n is a number), "JOB_ID n" (n is the id) (see parseDependency())
+        :param dependency: "LAST_ADDED", "LAST n" (n is a number), "JOB_ID n" (n is the id) (see readDependency())
         :return: True for success and False for failure
         '''
         if (self.scheduler not in self.schedulersSupported):
-            sys.stderr.write("Scheduler not supported.\n")
-            sys.exit(1)
-        self.jobsType.append([])
-        command = command.replace("\n","") #removes any newline characters
-        self.commands.append(self._getCommandString(command, dependency, dependencyType, translate))
+            raise UnsupportedScheduler("Scheduler not supported.", self.scheduler)
+        self.addJobSpec(script_ir.Job(command, self.readDependency(dependency, dependencyType)))
+    def addJobSpec(self, job):
+        '''
+            Add a script_ir.Job to the script
+        '''
+        if (self.scheduler not in self.schedulersSupported):
+            raise UnsupportedScheduler("Scheduler not supported.", self.scheduler)
+        if (job.prefix is None):
+            launcher, command = self._getLauncher(job.command.replace("\n","")) #removes any newline characters
+        elif (self.table is None):
+            launcher, command = (job.prefix + "LAUNCH " if job.prefix else ""), job.command
+        else:
+            launcher, command = job.prefix + self.table.launcher, job.command
+        jobs = self.graph.__len__()
+        kind = (self.dependencyKind, self.mixedDependenciesFrom)
+        self.numJobs += 1
+        try:
+            line = self._getCommandString(launcher, command, job.dependency)
+        except TranslationError:  # the job is not added, the next job gets its number
+            self.numJobs -= 1
+            self.graph.truncate(jobs)
+            self.dependencyKind, self.mixedDependenciesFrom = kind
+            raise
+        if (line is not None):
+            self.commands.append(line)
     def addLineParsed(self, command):
         '''
             Add a line parsing it with the parseCommand function. Used in special cases when one wants to parse a command but not launch a job.
         '''
         if (self.scheduler not in self.schedulersSupported):
-            sys.stderr.write("Scheduler not supported.\n")
-            sys.exit(1)
-        self.jobsType.append([])
-        self.commands.append(self._parseCommand(command) + "\n")
+            raise UnsupportedScheduler("Scheduler not supported.", self.scheduler)
+        command = self._parseCommand(command)
+        self.numJobs += 1
+        self.graph.addJob(())  # keeps the numbers of the graph the same as the numbers of the jobs
+        self.commands.append(command + "\n")
     def setDefaultConfig(self, command):
+        '''
+            Options for every job, in the standard syntax, see addDefaultConfig
+        '''
         if (self.scheduler not in self.schedulersSupported):
-            sys.stderr.write("Scheduler not supported.\n")
-            sys.exit(1)
-        command = self._parseCommand(command)
+            raise UnsupportedScheduler("Scheduler not supported.", self.scheduler)
+        self.addDefaultConfig(script_ir.DefaultConfig(self.readCommand(command)))
+    def addDefaultConfig(self, config):
+        '''
+            Writes the options of a script_ir.DefaultConfig as a directive of the scheduler in the header.
+        '''
+        if (self.table is None):
+            return
+        command, warnings = self._writeCommand(config.items)
+        for x in warnings:
+            sys.stderr.write(x)
         if (command == ""):
             return
-        if (self.scheduler == "SLURM"):
-            self.defaultHeader += "#SBATCH "+ command +"\n"
-        elif (self.scheduler == "UGE"):
-            self.defaultHeader += "#$ " +  command + "\n"
+        self.defaultHeader.append(self.table.directive + command + "\n")
     def unsetDefaultConfig(self):
         self.defaultCommands = ""
     def _getLauncher(self, command):
@@ -158,24 +815,17 @@ class script_scheduler_writer:
         commandList = command.split()
         launcher = ""
         if (commandList[0] == "RUN"):
-            if (self.scheduler == "SLURM"):
-                launcher = "srun "
-                command = command.replace("RUN "," ",1)
-            else:
-                command = command.replace("RUN ", " ", 1)
+            if (self.table is not None):
+                launcher = self.table.localLauncher
+            command = command.replace("RUN ", " ", 1)
         else:
             if (commandList[0] == "LAUNCH" or command.find("LAUNCH ") < 0): #if the first command is LAUNCH or there`s no launch
                 command = command.replace("LAUNCH "," ")
-                if (self.scheduler == "UGE"):
-                    launcher = "qsub "
-                elif (self.scheduler == "SLURM"):
-                    launcher = "sbatch "
+                if (self.table is not None):
+                    launcher = self.table.launcher
             elif (command.find("LAUNCH ") >= 0): #otherwise, look for a LAUNCH, and replace it with the appropriate launcher.
-                if (self.scheduler == "UGE"):
-                    launcher = command.split("LAUNCH")[0]+"qsub "
-                    command = command.split("LAUNCH")[1]
-                elif (self.scheduler == "SLURM"):
-                    launcher = command.split("LAUNCH")[0]+"sbatch "
+                if (self.table is not None):
+                    launcher = command.split("LAUNCH")[0]+self.table.launcher
                     command = command.split("LAUNCH")[1]
 
         return (launcher,command)
@@ -186,69 +836,27 @@ class script_scheduler_writer:
                     Combination of opposites will result in error. ("Always" and "Never")
         '''
         if (self.scheduler not in self.schedulersSupported):
-            sys.stderr.write("Scheduler not supported.\n")
-            sys.exit(1)
-        if (email == "" or email == None):
+            raise UnsupportedScheduler("Scheduler not supported.", self.scheduler)
+        self.addEmailSpec(script_ir.EmailSpec(email, type))
+    def addEmailSpec(self, spec):
+        '''
+            Add the email configuration of a script_ir.EmailSpec, see addEmail
+        '''
+        if (spec.email == "" or spec.email == None):
             return
-        if (self.scheduler == "UGE"):
-            self.header += "#$ -M "+email+"\n"
-            if (type == ""):
-                return
-            self.header += "#$ -m "
-            if(type == "NEVER"):
-                self.header += "n\n"
-                return
-            type = type.split()
-            if ("ALWAYS" in  type and "NEVER" in type):
-                print("Conflicting email types.\n")
-                sys.exit()
-            if ("ALWAYS" in type):
-                self.header += "beas\n"
-                return
-            if ("START" in type):
-                self.header += "b"
-            if ("END" in type):
-                self.header += "e"
-            if ("ABORT" in type):
-                self.header += "a"
-            if ("SUSPENDED" in type):
-                self.header += "s"
-            self.header += "\n"
-        elif (self.scheduler == "SLURM"):
-            self.header += "#SBATCH --mail-user="+email+"\n"
-
-            self.header += "#SBATCH --mail-type="
-            if(type == "NEVER" or type == ""):
-                self.header += "NONE\n"
-                return
-            type = type.split()
-            set = False
-            if ("ALWAYS" in  type and "NEVER" in type):
-                print("Conflicting email types.\n")
-                sys.exit()
-            if ("ALWAYS" in type):
-                self.header += "ALL\n"
-                return
-            if ("START" in type):
-                self.header += "BEGIN"
-                set = True
-            if ("END" in type):
-                if (set):
-                    self.header += ","
-                self.header += "END"
-                set = True
-            if ("ABORT" in type or "SUSPENDED" in type):
-                if (set):
-                    self.header += ","
-                self.header += "FAIL"
-                set = True
-            self.header += "\n"
+        if (self.table is None):
+            return
+        if (spec.type != "" and spec.type != "NEVER"):
+            types = spec.type.split()
+            if ("ALWAYS" in types and "NEVER" in types):
+                raise ConflictingEmailTypes("Conflicting email types.", " ".join(types))
+        self.header.append(self.table.emailHeader(spec))
     def addLineHeader(self, line):
         '''
             Add a line to the header
         '''
         line = line.replace("#", "", 1)  # removes any shebang characters
-        self.header += "#"+line
+        self.header.append("#"+line)
     def addLine(self, line, newline = False):
         '''
             Add a line to the script. By default it does not add a newline character.
@@ -277,65 +885,239 @@ class script_scheduler_writer:
         comment = comment.replace("\n", "")  # removes any newline characters
         comment = comment.replace("#", "")  # removes any shebang characters
         self.commands.append("#"+comment+"\n")
-    def _getCommandString(self, command, dependency, dependencyType, translate = False):
-        command = self._getLauncher(command)
-        ret_string = self.name+"_JOB_"+str(self.jobsType.__len__()) + "=`" + command[0] + self._getDependencyString(dependency, dependencyType) + " " + self._parseCommand(command[1]).replace("\n", "") + "`\n"
-        ret_string += self.name+"_JOB_"+str(self.jobsType.__len__()) + "=`echo $" + self.name + "_JOB_" + str(self.jobsType.__len__()) + " | awk 'match($0,/[0-9]+/){print substr($0, RSTART, RLENGTH)}'`\n"
-        return ret_string
-    def _getDependencyString(self, dependency, dependencyType):
-        '''
-            Parses dependencies and return the appropriate string according to the scheduler
-        :param dependency: string to be parsed
-        :return: list of strings to be added
+    def _getCommandString(self, launcher, command, dependency):
         '''
-        dependencyType = dependencyType.replace(" ","")
-        self._parseDependency(dependency)
-        ret = ""
-        if (dependency == ""):
-            return ret
-        if (self.dependencies[self.jobsType.__len__()-1].__len__()==0):
-            return ret
-        if(self.scheduler=="UGE"):
-            if (self.dependenciesType[self.jobsType.__len__()-1][1] == "SINGLE"):
-                ret = "-hold_jid "
-            else:
-                ret = "-hold_jid_ad "
-            bool = False
-            for n in self.dependencies[self.jobsType.__len__()-1]:
-                if (bool):
-                    ret += ","
-                if (self.dependenciesType[self.jobsType.__len__()-1][0] == "JOB_NUM"):
-                    ret += "$"+self.name+"_JOB_"+str(n)
-                else:
-                    ret += str(n)
-                bool = True
-            ret += " "
-        elif (self.scheduler=="SLURM"):
-            if (dependencyType == "OKAY"):
-                ret = "--dependency=afterok:"
-            elif (dependencyType == "NOT OKAY"):
-                ret = "--dependency=afternotok:"
-            elif (dependencyType == "START"):
-                ret = "--dependency=after:"
-            else:
-                ret = "--dependency=afterany:"
-            bool = False
-            for n in self.dependencies[self.jobsType.__len__()-1]:
-                if (bool):
-                    ret += ":"
-                if (self.dependenciesType[self.jobsType.__len__()-1][0] == "JOB_NUM"):
-                    ret += "$"+self.name+"_JOB_"+str(n)
-                else:
-                    ret += str(n)
-                bool = True
-            ret += " "
-        return ret
+        :param command: the options and command in the standard syntax, or their items, see readCommand
+        :return: _JobLine for the job, its dependencies are only expanded when the script is written. None if the job
+                 was added to the job array at the end of the script instead, see collapseArrays.
+        '''
+        if (dependency is not None and dependency.kind == "JOB_NUM"):
+            number = self.graph.addJob(dependency.jobs)
+            kind = (dependency.type.replace(" ",""), dependency.array)
+            if (self.dependencyKind is None):
+                self.dependencyKind = kind
+            elif (kind != self.dependencyKind and self.mixedDependenciesFrom is None):
+                self.mixedDependenciesFrom = number
+        else:  # no dependency, or ids of jobs outside the script
+            number = self.graph.addJob(())
+        template = None
+        if (self.collapseArrays):
+            template = self._getArrayTemplate(launcher, command)
+            if (template is not None and self._addToJobArray(number, dependency, template)):
+                return None
+        line = _JobLine(number, launcher, self._parseCommand(command).replace("\n", ""), dependency)
+        self.lastJob = None
+        if (template is not None):
+            self.lastJob = (line,) + template
+        return line
+    def _getArrayTemplate(self, launcher, command):
+        '''
+            Splits the command of a job that could be a task of a job array: submitted with the launcher of the
+            scheduler, not an array already, the keywords first and then a program whose words need no quoting.
+        :param command: the options and command in the standard syntax, or their items, see readCommand
+        :return: (tuple of script_ir.ResourceRequest, words of the program), or None if the job cannot be a task
+        '''
+        if (self.table is None or launcher != self.table.launcher):
+            return None
+        keywords = STANDARD_KEYWORDS
+        request = script_ir.ResourceRequest
+        options = []
+        found = set()
+        if (isinstance(command, tuple)):
+            x = 0
+            while (x < command.__len__() and command[x].__class__ is request):
+                options.append(command[x])
+                x += 1
+            if ([item for item in command[x:] if item.__class__ is request]):  # keywords after the program
+                return None
+            words = " ".join(command[x:]).split()
+            x = 0
+        else:
+            words = command.split()
+            x = 0
+            while (x < words.__len__() and words[x] in keywords):
+                start = x + 1
+                x = start + keywords[words[x]][0]
+                options.append(request(words[start - 1], tuple(words[start:x])))
+            if (x > words.__len__()):  # arguments missing
+                return None
+        for keyword, args in options:
+            if (keyword in found or keyword == "JOB_ARRAY" or [w for w in args if "TASK_ID" in w]):
+                return None  # the arguments deleted with a repeated keyword differ, do not bother
+            found.add(keyword)
+        if (x >= words.__len__() or words[x].startswith("-")):  # no program, or options of the scheduler left
+            return None
+        program = words[x:]
+        for word in program:
+            if (word in keywords or "TASK_ID" in word or not _SHELL_WORD.match(word)):
+                return None
+        return (tuple(options), program)
+    def _addToJobArray(self, number, dependency, template):
+        '''
+            Adds the job to the job array at the end of the script, or turns the job at the end of the script into a
+            job array with it, if it only differs from them in one argument of the program.
+        :param number: number of the job
+        :param dependency: script_ir.Dependency of the job, or None
+        :param template: see _getArrayTemplate
+        :return: True if the job was added to the job array
+        '''
+        if (self.lastJob is None or not self.commands or self.commands[-1] is not self.lastJob[0]):
+            return False
+        last, options, program = self.lastJob
+        size = 1
+        if (isinstance(last, _JobArray)):
+            size = last.values.__len__()
+        if (number != last.job + size or options != template[0] or program.__len__() != template[1].__len__()):
+            return False
+        if (not self._sameDependency(dependency, last.dependency)):
+            return False
+        changed = [x for x in range(program.__len__()) if program[x] != template[1][x]]
+        if (isinstance(last, _JobArray)):
+            if (changed and changed != [last.position]):
+                return False
+            last.values.append(template[1][last.position])
+            return True
+        if (changed.__len__() != 1 or changed[0] == 0):  # only an argument may change, not the program itself
+            return False
+        jobArray = _JobArray(last, options, program, changed[0], [program[changed[0]], template[1][changed[0]]])
+        self.commands[-1] = jobArray
+        self.lastJob = (jobArray, options, program)
+        return True
+    def _sameDependency(self, dependency, other):
+        '''
+        :return: True if both script_ir.Dependency (or None) wait for the same jobs the same way
+        '''
+        if (dependency is None or other is None):
+            return dependency is other
+        return (dependency.kind == other.kind and dependency.array == other.array and dependency.type == other.type
+                and self._sameJobs(dependency.jobs, other.jobs))
+    def _sameJobs(self, jobs, otherJobs):
+        '''
+        :return: True if both dependencies list the same jobs, without expanding ranges
+        '''
+        if (jobs.__len__() != otherJobs.__len__()):
+            return False
+        if (isinstance(jobs, _range) and isinstance(otherJobs, _range)):
+            return jobs.__len__() == 0 or jobs[0] == otherJobs[0]
+        return list(jobs) == list(otherJobs)
+    def _iterJobArray(self, jobArray):
+        '''
+        :return: iterator over the lines submitting the job array, then setting the variables of its other jobs
+        '''
+        barriers = []
+        dependencies = self._getDependencyString(jobArray.dependency, jobArray.job, barriers)
+        for line in barriers:
+            yield line
+        size = jobArray.values.__len__()
+        options = jobArray.options + (script_ir.ResourceRequest("JOB_ARRAY", ("1-" + str(size),)),)
+        options = self._parseCommand(options).replace("\n", "")
+        program = list(jobArray.program)
+        program[jobArray.position] = "$(echo \"" + " ".join(jobArray.values) + "\" | cut -d\" \" -f" + \
+                                     self.table.taskId + ")"
+        job = self.name + "_JOB_" + str(jobArray.job)
+        yield job + "=`" + self.table.launcher + dependencies + " " + options + " " + \
+            self.table.wrapper.format(" ".join(program)) + "`\n"
+        yield self._getJobIdLine(job)
+        for x in range(jobArray.job + 1, jobArray.job + size):
+            yield self.name + "_JOB_" + str(x) + "=$" + job + "\n"
+    def _canReduceDependencies(self, job):
+        '''
+            Dropping the dependency on a job that is also an ancestor of another dependency only keeps the same meaning
+            if every dependency on the way has the same kind: "after job 1 succeeded" is not implied by "after job 2
+            ended" when job 2 only waited for job 1 to end, and a task of an array waiting for the same task of
+            another array does not wait for the whole array.
+        :param job: number of the job
+        :return: True if every job up to job that depends on other jobs does it the same way
+        '''
+        return self.mixedDependenciesFrom is None or job < self.mixedDependenciesFrom
+    def _getJobIdLine(self, variable):
+        '''
+        :return: line keeping only the id of the job in variable, which holds the output of the launcher
+        '''
+        jobId = _JOB_ID
+        if (self.table is not None):
+            jobId = self.table.jobId
+        return variable + "=`echo $" + variable + " | awk 'match($0,/" + jobId + "/){print substr($0, RSTART, RLENGTH)}'`\n"
+    def _getDependencyString(self, dependency, job = None, barriers = None):
+        '''
+            Expands the dependencies of a job and return the appropriate string according to the scheduler
+        :param dependency: script_ir.Dependency of the job, or None
+        :param job: number of the job, needed to leave out the implied dependencies when self.reduceDependencies is set
+        :param barriers: list receiving the lines to write before the job when its dependencies are split between
+                         barrier jobs, see _getBarriers. The dependencies are never split without it.
+        :return: string to be added to the launch command
+        '''
+        if (dependency is None or dependency.jobs.__len__()==0):
+            return ""
+        jobs = dependency.jobs
+        dependencyType = dependency.type
+        array = dependency.array
+        if (array and self.table is not None and self.table.taskDependencies is not True
+                and dependencyType.replace(" ","") not in self.table.taskDependencies):
+            sys.stderr.write("Job " + str(job) + " depends on arrays task by task, which " + self.scheduler + " does "
+                             "not support for this dependency type. Its tasks wait for the whole arrays.\n")
+            array = False
+        if (dependency.kind == "JOB_NUM"):
+            if (self.reduceDependencies and job is not None and self._canReduceDependencies(job)):
+                jobs = self.graph.reducedDependencies(job)
+            jobs = [self.getJobVariable(n) for n in jobs]
+        else:
+            jobs = [str(n) for n in jobs]
+        if (barriers is not None and job is not None and self.table is not None
+                and jobs.__len__() > self.maxDependencies):
+            jobs, array, dependencyType = self._getBarriers(jobs, dependencyType, array, job, barriers)
+        return self._formatDependencies(jobs, dependencyType, array)
+    def _getBarriers(self, jobs, dependencyType, array, job, barriers):
+        '''
+            Splits a list of dependencies too long for a command line (or for the scheduler) between barrier jobs,
+            each one doing nothing but waiting for maxDependencies of them. The job then depends on the barriers
+            instead, with more levels of barriers if there are still too many.
+            Only the barriers waiting for the jobs themselves have the dependency type of the job: a barrier runs once
+            its dependencies are satisfied, and then succeeds, so everything waiting for barriers waits for them to
+            succeed. Keeping the type there would never start a job depending on failed jobs (NOT OKAY).
+            A barrier is not an array, so a UGE array depending task by task (-hold_jid_ad) waits for the whole
+            arrays instead.
+        :param jobs: the dependencies, as written in the script
+        :param barriers: list receiving the lines submitting the barriers
+        :return: (variables of the barriers the job depends on, False since the dependency on them is not by task,
+                  "OKAY", the dependency type on them)
+        '''
+        if (array):
+            sys.stderr.write("Job " + str(job) + " depends on more than " + str(self.maxDependencies) + " jobs. Its "
+                             "tasks wait for the whole arrays.\n")
+        size = max(self.maxDependencies, 2)
+        count = 0
+        while (jobs.__len__() > size):
+            level = []
+            for start in range(0, jobs.__len__(), size):
+                count += 1
+                barrier = self.name + "_JOB_" + str(job) + "_BARRIER_" + str(count)
+                dependencies = self._formatDependencies(jobs[start:start + size], dependencyType, False)
+                barriers.append(barrier + "=`" + self.table.barrier.format(dependencies) + "`\n")
+                barriers.append(self._getJobIdLine(barrier))
+                level.append("$" + barrier)
+            jobs = level
+            dependencyType = "OKAY"
+        return (jobs, False, "OKAY")
+    def _formatDependencies(self, jobs, dependencyType, array):
+        '''
+        :param jobs: the dependencies, as written in the script
+        :param array: True if the tasks of the job depend on the same tasks of the jobs
+        :return: option of the launcher of the scheduler depending on jobs
+        '''
+        if (self.table is None):
+            return ""
+        option, separator, end = self.table.dependencyOption(dependencyType.replace(" ",""), array)
+        return option + separator.join(jobs) + end + " "
 
 
-    def _parseDependency(self, dependency):
+    def readDependency(self, dependency, dependencyType = ""):
         '''
-            Parses dependencies to self.dependency, to be turned into a string later
+            Parses the dependency of the next job added.
+            Ranges of jobs (LAST N, ALL_ADDED...) are kept as a range, lists of jobs as an array, ids as a tuple.
         :param dependency: string to be parsed
+        :param dependencyType: see addJob
+        :return: script_ir.Dependency, or None for no dependency
         '''
         '''
         List of constants: (N stands for a number) (More than one kind of dependency will probably cause errors)
@@ -350,107 +1132,55 @@ class script_scheduler_writer:
             ALL_ADDED : depends on all jobs added so far.
             ALL_ADDED_ARRAY : depends on all jobs added so far. The current job must be an array.
         '''
+        numJobs = self.numJobs + 1  # counting the job the dependency is for
         if (dependency == ""):
-            self.dependencies.append([])
-            self.dependenciesType.append(("NONE","NONE"))
-        else:
-            #SINGLE DEPENDENCY
-            if (dependency.replace(" ","") == "LAST_ADDED"):
-                if (self.jobsType.__len__() == 0):
-                    sys.stderr.write("The first job added cannot depend on the last one added.\n")
-                    sys.exit()
-                else:
-                    self.dependenciesType.append(("JOB_NUM", "SINGLE"))
-                    self.dependencies.append([self.jobsType.__len__() - 1])
-                    return
-            if (dependency.replace(" ","") == "LAST_ADDED_ARRAY"):
-                if (self.jobsType.__len__() == 0):
-                    sys.stderr.write("The first job added cannot depend on the last one added.\n")
-                    sys.exit()
-                else:
-                    self.dependenciesType.append(("JOB_NUM", "ARRAY"))
-                    self.dependencies.append([self.jobsType.__len__() - 1])
-                    return
-            dependency = dependency.split()
-            if ("LAST" in dependency):
-                pos_dependency = dependency.index("LAST")+1
-                num_dependency = int(dependency[pos_dependency])
-                self.dependenciesType.append(("JOB_NUM","SINGLE"))
-                self.dependencies.append([])
-                for x in range(self.jobsType.__len__()-num_dependency, self.jobsType.__len__()):
-                    self.dependencies[self.dependencies.__len__()-1].append(x)
-            elif ("JOB_ID" in dependency):
-                self.dependenciesType.append(("JOB_ID","SINGLE"))
-                self.dependencies.append([])
-                for x in range(1,dependency.__len__()):
-                    if (dependency[x].isdigit()):
-                        num_dependency = int(dependency[x])
-                    else:
-                        num_dependency = dependency[x]
-                    self.dependencies[self.dependencies.__len__()-1].append(num_dependency)
-            elif ("JOBS_LIST" in dependency or "JOB_LIST" in dependency):
-                self.dependencies.append([])
-                self.dependenciesType.append(("JOB_NUM","SINGLE"))
-                for x in range(1,dependency.__len__()):
+            return None
+        #SINGLE DEPENDENCY
+        if (dependency.replace(" ","") == "LAST_ADDED"):
+            if (numJobs == 1):
+                raise InvalidDependency("The first job added cannot depend on the last one added.", dependency)
+            return script_ir.Dependency("JOB_NUM", _range(numJobs - 1, numJobs), False, dependencyType)
+        if (dependency.replace(" ","") == "LAST_ADDED_ARRAY"):
+            if (numJobs == 1):
+                raise InvalidDependency("The first job added cannot depend on the last one added.", dependency)
+            return script_ir.Dependency("JOB_NUM", _range(numJobs - 1, numJobs), True, dependencyType)
+        dependency = dependency.split()
+        if ("LAST" in dependency):
+            num_dependency = _jobNumber(dependency, dependency.index("LAST")+1)
+            return script_ir.Dependency("JOB_NUM", _range(numJobs-num_dependency, numJobs), False, dependencyType)
+        elif ("JOB_ID" in dependency):
+            ids = []
+            for x in range(1,dependency.__len__()):
+                if (dependency[x].isdigit()):
                     num_dependency = int(dependency[x])
-                    self.dependencies[self.dependencies.__len__()-1].append(num_dependency)
-            elif ("ALL_ADDED" in dependency):
-                self.dependenciesType.append(("JOB_NUM","SINGLE"))
-                self.dependencies.append([])
-                for x in range(1, self.jobsType.__len__()):
-                    self.dependencies[self.dependencies.__len__()-1].append(x)
-            #JOB ARRAYS DEPENDENCY
-            elif ("LAST_ARRAY" in dependency):
-                pos_dependency = dependency.index("LAST_ARRAY")+1
-                num_dependency = int(dependency[pos_dependency])
-                self.dependenciesType.append(("JOB_NUM","ARRAY"))
-                self.dependencies.append([])
-                for x in range(self.jobsType.__len__()-num_dependency, self.jobsType.__len__()):
-                    self.dependencies[self.dependencies.__len__()-1].append(x)
-            elif ("JOB_ID_ARRAY" in dependency):
-                self.dependenciesType.append(("JOB_ID","ARRAY"))
-                self.dependencies.append([])
-                for x in range(1,dependency.__len__()):
-                    num_dependency = int(dependency[x])
-                    self.dependencies[self.dependencies.__len__()-1].append(num_dependency)
-            elif ("JOBS_LIST_ARRAY" in dependency or "JOB_LIST" in dependency):
-                self.dependencies.append([])
-                self.dependenciesType.append(("JOB_NUM","ARRAY"))
-                for x in range(1,dependency.__len__()):
-                    num_dependency = int(dependency[x])
-                    self.dependencies[self.dependencies.__len__()-1].append(num_dependency)
-            elif ("ALL_ADDED_ARRAY" in dependency):
-                self.dependenciesType.append(("JOB_NUM","ARRAY"))
-                self.dependencies.append([])
-                for x in range(1, self.jobsType.__len__()):
-                    self.dependencies[self.dependencies.__len__()-1].append(x)
-            else:
-                sys.stderr.write("Dependency \""+str(dependency)+"\" not supported.\n")
-                sys.exit(1)
-
-    def _deleteOtherOccurances(self, command, occurance, num_args=0):
-        if (num_args == 0):
-            command = command.replace(occurance, "")
-        else:
-            # delete additional occurances
-            args = 0
-            list = command.split()
-            auxCommand = ""
-            for x in list:
-                if x == occurance:  # delete occurrance
-                    args = num_args
-                elif args > 0:  # delete argument of the additional occurrance
-                    args -= 1
                 else:
-                    auxCommand += x+" "
-            command = auxCommand
-        return command
+                    num_dependency = dependency[x]
+                ids.append(num_dependency)
+            return script_ir.Dependency("JOB_ID", tuple(ids), False, dependencyType)
+        elif ("JOBS_LIST" in dependency or "JOB_LIST" in dependency):
+            jobs = array.array("i", [_jobNumber(dependency, x) for x in range(1, dependency.__len__())])
+            return script_ir.Dependency("JOB_NUM", jobs, False, dependencyType)
+        elif ("ALL_ADDED" in dependency):
+            return script_ir.Dependency("JOB_NUM", _range(1, numJobs), False, dependencyType)
+        #JOB ARRAYS DEPENDENCY
+        elif ("LAST_ARRAY" in dependency):
+            num_dependency = _jobNumber(dependency, dependency.index("LAST_ARRAY")+1)
+            return script_ir.Dependency("JOB_NUM", _range(numJobs-num_dependency, numJobs), True, dependencyType)
+        elif ("JOB_ID_ARRAY" in dependency):
+            return script_ir.Dependency("JOB_ID", tuple([_jobNumber(dependency, x) for x in range(1, dependency.__len__())]), True, dependencyType)
+        elif ("JOBS_LIST_ARRAY" in dependency or "JOB_LIST" in dependency):
+            jobs = array.array("i", [_jobNumber(dependency, x) for x in range(1, dependency.__len__())])
+            return script_ir.Dependency("JOB_NUM", jobs, True, dependencyType)
+        elif ("ALL_ADDED_ARRAY" in dependency):
+            return script_ir.Dependency("JOB_NUM", _range(1, numJobs), True, dependencyType)
+        else:
+            raise InvalidDependency("Dependency \""+str(dependency)+"\" not supported.", str(dependency))
 
-    def _parseCommand(self, command): #TODO: ignore unknown commands option (this is currently turned on)
-                                     #TODO: add other mem and nodes options
+    def _parseCommand(self, command): #TODO: add other mem and nodes options
         '''
-            Parses the input command looking for certain keywords and replacing them with the appropriate string
-        :param command: command to be parsed
+            Parses the input command looking for certain keywords and replacing them with the appropriate string.
+            The command is read once into items (see readCommand), which the table of the scheduler then writes.
+        :param command: command to be parsed, or its items already read, see readCommand
         :return: string to be written in the script
         '''
         '''
@@ -462,107 +1192,99 @@ class script_scheduler_writer:
             JOB_ARRAY N1:N2 : sets a job array from N1 to N2. (N1 > 0)
             TASK_ID : substituted to the variable set by the scheduler that tells the task id
             RESOURCE_MEM N : requests N amount of memory. Specify either MB or GB right after N. e.g. "RESOURCE_MEM 200MB"
+                             0 requests all the memory of the node, only SLURM has it
             RESOURCE_CCM : request ccm capabality
-            RESOURCE_PRIOR_QUEUE "": requests a certain priority queue
+            RESOURCE_PRIOR "": requests a certain priority queue
             OUTPUT_CURRENT_DIR : write jobs output to the current directory
+        Only the first occurrence of a keyword is translated, the others are deleted along with their arguments.
         '''
-        if (self.scheduler == "UGE"):
-            command = command.replace("JOB_NAME ","-N ", 1) # replace the first occurrance
-            #delete additional occurances
-            command = self._deleteOtherOccurances(command, "JOB_NAME", 1)
-        elif (self.scheduler == "SLURM"):
-            command = command.replace("JOB_NAME ", "--job-name=", 1)
-            command = self._deleteOtherOccurances(command, "JOB_NAME", 1)
-
-        if (self.scheduler == "UGE"):
-            command = command.replace("RESOURCE_NODES ","-pe pe_slots ", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_NODES", 1)
-
-        elif (self.scheduler == "SLURM"):
-            command = command.replace("RESOURCE_NODES ","-N ", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_NODES", 1)
-
-        if (self.scheduler == "UGE"):
-            command = command.replace("RESOURCE_IB","-l infiniband.c=1", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_IB")
-        elif (self.scheduler == "SLURM"):
-            if (command.find("RESOURCE_IB") >= 0):
-                sys.stderr.write("Command RESOURCE_IB not available for SLURM. Ignored.\n")
-                command = command.replace("RESOURCE_IB", "")
-
-        if (self.scheduler == "UGE"):
-            command = command.replace("RESOURCE_EXCLUSIVE","-l exclusive.c", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_EXCLUSIVE")
-        elif (self.scheduler == "SLURM"):
-            command = command.replace("RESOURCE_EXCLUSIVE","--exclusive", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_EXCLUSIVE")
-
-        if (self.scheduler == "UGE"):
-            command = command.replace("JOB_ARRAY ","-t ", 1)
-            command = self._deleteOtherOccurances(command, "JOB_ARRAY", 1)
-        elif (self.scheduler == "SLURM"):
-            list = command.split()
-            auxCommand = ""
-            found = False
-            for x in list:
-                if x == "JOB_ARRAY":
-                    auxCommand += "--array="
-                    found = True
-                elif found:
-                    auxCommand += x.replace(":","-",1)
-                    break
-                else:
-                    auxCommand += x+" "
-            command = auxCommand
-            command = self._deleteOtherOccurances(command, "JOB_ARRAY", 1)
-
-        if (self.scheduler == "UGE"):
-            command = command.replace("TASK_ID","$SGE_TASK_ID")
-        elif (self.scheduler == "SLURM"):
-            command = command.replace("TASK_ID","$SLURM_TASK_ID")
-
-# TW: No support for "-l h_rt"
-# TW: This seems not to work...
-        if (self.scheduler == "UGE"):
-            command = command.replace("RESOURCE_MEM ", "-l ram.c=", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_MEM", 1)
-            if (command.find("-l ram.c=") >= 0):
-                list = command.split("-l ram.c=")
-                listAux = list[1].split(" ")
-                listAux[0] = listAux[0].replace("MB","M")
-                listAux[0] = listAux[0].replace("GB","G")
-                list[1] = " ".join(listAux)
-                command = "-l ram.c=".join(list)
-        elif (self.scheduler == "SLURM"):
-            command = command.replace("RESOURCE_MEM ", "--mem=", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_MEM", 1)
-
-        if (self.scheduler == "UGE"):
-            if (command.find("RESOURCE_CCM") >= 0):
-                sys.stderr.write("Command RESOURCE_CCM not available for UGE.\n")
-                sys.exit(1)
-        elif (self.scheduler == "SLURM"):
-            command = command.replace("RESOURCE_CCM", "-ccm", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_CCM")
-
-        if (self.scheduler == "UGE"):
-            command = command.replace("RESOURCE_PRIOR", "-l", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_PRIOR", 1)
-        elif (self.scheduler == "SLURM"):
-            command = command.replace("RESOURCE_PRIOR ", "--qos=", 1)
-            command = self._deleteOtherOccurances(command, "RESOURCE_PRIOR", 1)
-
-        if (self.scheduler == "UGE"):
-            command = command.replace("OUTPUT_CURRENT_DIR", "-cwd", 1)
-            command = self._deleteOtherOccurances(command, "OUTPUT_CURRENT_DIR", 1)
-        elif (self.scheduler == "SLURM"):
-            #ignore, this is the default in SLURM
-            command = command.replace("OUTPUT_CURRENT_DIR", "", 1)
-            command = self._deleteOtherOccurances(command, "OUTPUT_CURRENT_DIR", 1)
-
-# TW: doesn't support UGE "-v environment_variable=value"
-        return command
+        if (self.table is None):  # standard syntax, nothing to translate
+            if (isinstance(command, tuple)):
+                return itemsToStandard(command)
+            return command
+        key = (self.scheduler, command)
+        entry = lineMemo.get(key)
+        if (entry is None):
+            items = command
+            if (not isinstance(command, tuple)):
+                items = self.readCommand(command)
+            entry = self._writeCommand(items)
+            lineMemo.put(key, entry)
+        for x in entry[1]:
+            sys.stderr.write(x)
+        return entry[0]
 
+    def readCommand(self, command):
+        '''
+            Reads a command of the standard syntax into items, the same for every scheduler. Only the first occurrence
+            of a keyword is kept, the others are deleted along with their arguments, and a keyword missing arguments
+            is deleted with the rest of the command.
+        :return: tuple of script_ir.ResourceRequest for the keywords, and strings for the runs of words between them
+        '''
+        keywords = STANDARD_KEYWORDS
+        request = script_ir.ResourceRequest
+        words = command.split()
+        numWords = words.__len__()
+        items = []
+        found = set()
+        start = 0  # first word not added to items yet
+        for x in [x for x, word in enumerate(words) if word in keywords]:
+            if (x < start):  # argument of a previous keyword
+                continue
+            if (start < x):  # the run of other words before the keyword, as one string
+                items.append(" ".join(words[start:x]))
+            word = words[x]
+            numArgs, numArgsRepeated = keywords[word]
+            x += 1
+            if (word in found):  # delete additional occurrences
+                start = x + numArgsRepeated
+                continue
+            found.add(word)
+            if (x + numArgs > numWords):  # argument missing, delete the keyword
+                start = numWords
+                break
+            start = x + numArgs
+            items.append(request(word, tuple(words[x:start])))
+        if (start < numWords):
+            items.append(" ".join(words[start:]))
+        return tuple(items)
+
+    def _writeCommand(self, items):
+        '''
+            Writes the items of a command (see readCommand) for the scheduler.
+        :return: (string to be written in the script, list of warnings)
+        '''
+        table = self.table
+        if (table.combineItems is not None):
+            items = table.combineItems(items)
+        warnings = []
+        taskId = table.taskId
+        keywords = table.words
+        request = script_ir.ResourceRequest
+        parsed = []
+        for item in items:
+            if (item.__class__ is not request):
+                parsed.append(item.replace("TASK_ID", taskId))
+                continue
+            word, args = item
+            entry = keywords.get(word)
+            if (entry is None):  # not known to the scheduler, written as it is
+                parsed.extend([w.replace("TASK_ID", taskId) for w in (word,) + args])
+                continue
+            replacement, convert, unavailable = entry
+            if (unavailable is not None):
+                if (unavailable):
+                    raise UnavailableKeyword("Command " + word + " not available for " + self.scheduler + ".", word)
+                warnings.append("Command " + word + " not available for " + self.scheduler + ". Ignored.\n")
+                continue
+            args = [w.replace("TASK_ID", taskId) for w in args]
+            if (convert is not None):
+                args = [convert(w) for w in args]
+            if (replacement != ""):
+                parsed.append(replacement.format(*args))
+        if (not parsed):
+            return ("", warnings)
+        return (" ".join(parsed) + " ", warnings)
 
     def unitTest(self): #TODO: automatize the result checking, instead of prinnting it
 
@@ -701,9 +1423,294 @@ class script_scheduler_writer:
 
         self.clearAll()
 
+        result = True
+
+        print "Test 3: dependencies"
+
+        print "--------------------------------------------------"
+
+        # a job whose dependency or command is rejected is not added, the next job takes its number
+        writer = script_scheduler_writer("SLURM")
+        writer.addJob("./job1.sh")
+        result &= _checkError("dependency on a later job", InvalidDependency, writer.addJob, "./job2.sh", "JOBS_LIST 7")
+        result &= _checkError("job number not a number", InvalidDependency, writer.addJob, "./job2.sh", "LAST x")
+        result &= _checkError("missing job number", InvalidDependency, writer.addJob, "./job2.sh", "LAST_ARRAY")
+        writer.addJob("./job2.sh", "LAST_ADDED")
+        result &= _checkScript("rejected dependency", writer.getScript(),
+                               ["Name_JOB_2=`sbatch --dependency=afterany:$Name_JOB_1  ./job2.sh `"], ["Name_JOB_3"])
+        writer = script_scheduler_writer("UGE")
+        writer.addJob("./job1.sh")
+        result &= _checkError("unavailable keyword", UnavailableKeyword, writer.addJob, "RESOURCE_CCM ./job2.sh",
+                              "LAST_ADDED")
+        writer.addJob("./job2.sh", "LAST_ADDED")
+        result &= _checkScript("rejected command", writer.getScript(),
+                               ["Name_JOB_2=`qsub -hold_jid $Name_JOB_1  ./job2.sh `"], ["Name_JOB_3"])
+
+        # with reduceDependencies, only the last job of a chain is written
+        writer = script_scheduler_writer("SLURM")
+        writer.reduceDependencies = True
+        writer.addJob("./job1.sh")
+        writer.addJob("./job2.sh", "LAST_ADDED")
+        writer.addJob("./job3.sh", "ALL_ADDED")
+        writer.addJob("./job4.sh", "JOBS_LIST 1 3", "OKAY")
+        result &= _checkScript("reduced dependencies", writer.getScript(),
+                               ["Name_JOB_3=`sbatch --dependency=afterany:$Name_JOB_2  ./job3.sh `",
+                                "Name_JOB_4=`sbatch --dependency=afterok:$Name_JOB_1:$Name_JOB_3  ./job4.sh `"])
+
+        # a job fanning in over independent jobs and chains keeps the same jobs as checking every pair
+        graph = DependencyGraph()
+        for x in range(1, 2001):
+            if (x % 500 == 0):
+                graph.addJob(_range(x - 3, x))  # depends on the 3 jobs before it
+            elif (x % 7 == 0):
+                graph.addJob(array.array("i", [x - 1, x - 5]))
+            else:
+                graph.addJob(())
+        fanIn = graph.addJob(_range(1, 2001))
+        lists = graph.addJob(array.array("i", [1500, 1499, 1497, 700, 699, 6]))
+        for job in (fanIn, lists):
+            parents = sorted(set(graph.parents[job]))
+            bruteForce = [x for x in parents if not any(graph.isAncestor(x, y) for y in parents if y != x)]
+            reduced = graph.reducedDependencies(job)
+            if (reduced != bruteForce):
+                print "fan-in reduction of job " + str(job) + ": FAILED, " + str(reduced)
+                result = False
+            else:
+                print "fan-in reduction of job " + str(job) + ": ok (" + str(reduced.__len__()) + " jobs kept)"
+
+        print "--------------------------------------------------"
+
+        print "Test 4: barriers"
+
+        print "--------------------------------------------------"
+
+        # the barriers waiting for the jobs keep the dependency type, the rest waits for the barriers to succeed
+        expected = {
+            "SLURM": ["BARRIER_1=`sbatch --dependency=afternotok:$Name_JOB_1:$Name_JOB_2:$Name_JOB_3 --wrap=true`",
+                      "BARRIER_4=`sbatch --dependency=afternotok:$Name_JOB_10 --wrap=true`",
+                      "BARRIER_5=`sbatch --dependency=afterok:$Name_JOB_11_BARRIER_1:$Name_JOB_11_BARRIER_2:"
+                      "$Name_JOB_11_BARRIER_3 --wrap=true`",
+                      "Name_JOB_11=`sbatch --dependency=afterok:$Name_JOB_11_BARRIER_5:$Name_JOB_11_BARRIER_6  "
+                      "./job11.sh `"],
+            "PBS": ["BARRIER_1=`qsub -W depend=afternotok:$Name_JOB_1:$Name_JOB_2:$Name_JOB_3 -- /bin/true`",
+                    "Name_JOB_11=`qsub -W depend=afterok:$Name_JOB_11_BARRIER_5:$Name_JOB_11_BARRIER_6  ./job11.sh `"],
+            "LSF": ["BARRIER_1=`bsub -w \"exit($Name_JOB_1) && exit($Name_JOB_2) && exit($Name_JOB_3)\" true`",
+                    "BARRIER_6=`bsub -w \"done($Name_JOB_11_BARRIER_4)\" true`",
+                    "Name_JOB_11=`bsub -w \"done($Name_JOB_11_BARRIER_5) && done($Name_JOB_11_BARRIER_6)\"  "
+                    "./job11.sh `"],
+            "UGE": ["BARRIER_1=`qsub -b y -hold_jid $Name_JOB_1,$Name_JOB_2,$Name_JOB_3 true`",
+                    "Name_JOB_11=`qsub -hold_jid $Name_JOB_11_BARRIER_5,$Name_JOB_11_BARRIER_6  ./job11.sh `"],
+        }
+        for scheduler in ["SLURM", "PBS", "LSF", "UGE"]:
+            writer = script_scheduler_writer(scheduler)
+            writer.maxDependencies = 3
+            for x in range(1, 11):
+                writer.addJob("./job" + str(x) + ".sh")
+            writer.addJob("./job11.sh", "ALL_ADDED", "NOT OKAY")
+            result &= _checkScript("NOT OKAY through barriers on " + scheduler, writer.getScript(),
+                                   expected[scheduler], ["BARRIER_7", "afternotok:$Name_JOB_11", "exit($Name_JOB_11"])
+
+        print "--------------------------------------------------"
+
+        print "Test 5: backends"
+
+        print "--------------------------------------------------"
+
+        # a backend registered again replaces the lines already parsed with the previous one
+        registerScheduler("TEST", "scheduler_pbs")
+        writer = script_scheduler_writer("TEST")
+        writer.addJob("JOB_NAME first ./job1.sh")
+        result &= _checkScript("registered backend", writer.getScript(), ["`qsub  -N first ./job1.sh `"])
+        registerScheduler("TEST", "scheduler_lsf")
+        writer = script_scheduler_writer("TEST")
+        writer.addJob("JOB_NAME first ./job1.sh")
+        result &= _checkScript("registered again", writer.getScript(), ["`bsub  -J first ./job1.sh `"], ["qsub"])
+        del SCHEDULERS["TEST"]
+        _tables.pop("TEST", None)
+        lineMemo.forget("TEST")
+
+        print "--------------------------------------------------"
+
+        print "Test 6: collapsed job arrays"
+
+        print "--------------------------------------------------"
+
+        # each task picks its argument with the task id variable of the scheduler
+        values = " $(echo \"input_1 input_2 input_3\" | cut -d\" \" -f"
+        expected = {
+            "UGE": "Name_JOB_2=`qsub -hold_jid $Name_JOB_1  -N step -pe pe_slots 2 -t 1-3  -b y sh -c './job.sh" +
+                   values + "$SGE_TASK_ID)'`",
+            "SLURM": "Name_JOB_2=`sbatch --dependency=afterany:$Name_JOB_1  --job-name=step -N 2 --array=1-3  "
+                     "--wrap='./job.sh" + values + "$SLURM_ARRAY_TASK_ID)'`",
+            "PBS": "Name_JOB_2=`qsub -W depend=afterany:$Name_JOB_1  -N step -l select=2 -J 1-3  -- /bin/sh -c "
+                   "'./job.sh" + values + "$PBS_ARRAY_INDEX)'`",
+            "LSF": "Name_JOB_2=`bsub -w \"ended($Name_JOB_1)\"  -n 2 -J \"step[1-3]\"  sh -c './job.sh" + values +
+                   "$LSB_JOBINDEX)'`",
+        }
+        for scheduler in ["UGE", "SLURM", "PBS", "LSF"]:
+            writer = script_scheduler_writer(scheduler)
+            writer.collapseArrays = True
+            writer.addJob("./prep.sh")
+            for x in range(1, 4):
+                writer.addJob("JOB_NAME step RESOURCE_NODES 2 ./job.sh input_" + str(x), "JOBS_LIST 1")
+            writer.addJob("./post.sh", "LAST_ADDED")
+            result &= _checkScript("collapsed array on " + scheduler, writer.getScript(),
+                                   [expected[scheduler], "Name_JOB_3=$Name_JOB_2\n", "Name_JOB_4=$Name_JOB_2\n"],
+                                   ["$SLURM_TASK_ID"])
+
+        # without dependencies task by task, a collapsed array warns like a job whose dependencies go to barriers
+        for scheduler in ["PBS", "LSF"]:
+            warning = " depends on arrays task by task, which " + scheduler + " does not support for this dependency " \
+                      "type. Its tasks wait for the whole arrays.\n"
+            writer = script_scheduler_writer(scheduler)
+            writer.collapseArrays = True
+            writer.addJob("JOB_ARRAY 1:3 ./prep.sh")
+            for x in range(1, 4):
+                writer.addJob("./job.sh input_" + str(x), "JOBS_LIST_ARRAY 1")
+            ok, script = _checkWarnings("collapsed array depending task by task on " + scheduler, ["Job 2" + warning],
+                                        writer.getScript)
+            result &= ok
+            result &= _checkScript("collapsed array depending on the whole array on " + scheduler, script,
+                                   ["Name_JOB_3=$Name_JOB_2\n"])
+            writer = script_scheduler_writer(scheduler)
+            writer.maxDependencies = 2
+            for x in range(1, 4):
+                writer.addJob("JOB_ARRAY 1:3 ./prep.sh")
+            writer.addJob("JOB_ARRAY 1:3 ./job.sh", "ALL_ADDED_ARRAY")
+            ok, script = _checkWarnings("barriers of an array depending task by task on " + scheduler,
+                                        ["Job 4" + warning], writer.getScript)
+            result &= ok
+
+        print "--------------------------------------------------"
+
+        print "Test 7: PBS and LSF"
+
+        print "--------------------------------------------------"
+
+        pbsId = " | awk 'match($0,/[0-9]+(\\[[0-9]*\\])?(\\.[A-Za-z0-9_.-]+)?/){print substr($0, RSTART, RLENGTH)}'`"
+        expected = {
+            "PBS": ["#PBS -M uname@lbl.gov\n#PBS -m ba\n#PBS -l mem=200mb \n",
+                    "Name_JOB_1=`qsub  -N first -l select=4 -l place=excl -q high ./job1.sh `",
+                    "Name_JOB_1=`echo $Name_JOB_1" + pbsId,  # keeps 123[].server, the id of a job array
+                    "Name_JOB_2=`qsub -W depend=afterok:$Name_JOB_1  -J 1-10:2 -N second ./job2.sh $PBS_ARRAY_INDEX `",
+                    "Name_JOB_3=`qsub -W depend=afternotok:$Name_JOB_1:$Name_JOB_2  ./job3.sh `",
+                    "Name_JOB_4=`qsub -W depend=after:$Name_JOB_2:$Name_JOB_3  ./job4.sh `",
+                    "Name_JOB_5=`qsub -W depend=afterany:$Name_JOB_4  -J 1-4 ./job5.sh `"],
+            "LSF": ["#BSUB -u uname@lbl.gov\n#BSUB -B\n#BSUB -N\n#BSUB -M 200MB -o %J.out \n",
+                    "Name_JOB_1=`bsub  -J first -n 4 -x -q high ./job1.sh `",
+                    "Name_JOB_2=`bsub -w \"done($Name_JOB_1)\"  -J \"second[1-10:2]\" ./job2.sh $LSB_JOBINDEX `",
+                    "Name_JOB_3=`bsub -w \"exit($Name_JOB_1) && exit($Name_JOB_2)\"  ./job3.sh `",
+                    "Name_JOB_4=`bsub -w \"started($Name_JOB_2) && started($Name_JOB_3)\"  ./job4.sh `",
+                    "Name_JOB_5=`bsub -w \"ended($Name_JOB_4)\"  -J \"array[1-4]\" ./job5.sh `"],
+        }
+        for scheduler in ["PBS", "LSF"]:
+            writer = script_scheduler_writer(scheduler)
+            writer.setDefaultConfig("RESOURCE_MEM 200MB OUTPUT_CURRENT_DIR")
+            writer.addEmail("uname@lbl.gov", "START ABORT")
+            writer.addJob("JOB_NAME first RESOURCE_NODES 4 RESOURCE_EXCLUSIVE RESOURCE_PRIOR high ./job1.sh")
+            writer.addJob("JOB_ARRAY 1:10:2 JOB_NAME second ./job2.sh TASK_ID", "LAST_ADDED", "OKAY")
+            writer.addJob("./job3.sh", "ALL_ADDED", "NOT OKAY")
+            writer.addJob("./job4.sh", "LAST 2", "START")
+            writer.addJob("JOB_ARRAY 1:4 ./job5.sh", "LAST_ADDED")
+            result &= _checkScript(scheduler + " backend", writer.getScript(), expected[scheduler])
+            result &= _checkError(scheduler + " without CCM", UnavailableKeyword, writer.addJob, "RESOURCE_CCM ./job6.sh")
+
+        print "--------------------------------------------------"
+
+        print "Test 8: dependencies of arrays"
+
+        print "--------------------------------------------------"
+
+        # Slurm only waits task by task for tasks succeeding (aftercorr), other types wait for the whole arrays
+        writer = script_scheduler_writer("SLURM")
+        writer.addJob("JOB_ARRAY 1:4 ./job1.sh")
+        writer.addJob("JOB_ARRAY 1:4 ./job2.sh", "LAST_ADDED_ARRAY", "OKAY")
+        writer.addJob("JOB_ARRAY 1:4 ./job3.sh", "LAST_ADDED_ARRAY")
+        ok, script = _checkWarnings("Slurm array ended in any state",
+                                    ["Job 3 depends on arrays task by task, which SLURM does not support for this "
+                                     "dependency type. Its tasks wait for the whole arrays.\n"], writer.getScript)
+        result &= ok
+        result &= _checkScript("Slurm array dependencies", script,
+                               ["Name_JOB_2=`sbatch --dependency=aftercorr:$Name_JOB_1  --array=1-4 ./job2.sh `",
+                                "Name_JOB_3=`sbatch --dependency=afterany:$Name_JOB_2  --array=1-4 ./job3.sh `"])
+
+        print "--------------------------------------------------"
+
+        return result
+
+
+def _checkScript(name, script, expected, unexpected=()):
+    '''
+        Prints whether script has every line of expected, and none of unexpected.
+    :return: True if it does
+    '''
+    missing = [x for x in expected if x not in script]
+    found = [x for x in unexpected if x in script]
+    if (missing or found):
+        print name + ": FAILED"
+        for x in missing:
+            print "    missing: " + x
+        for x in found:
+            print "    not expected: " + x
+        print script
+        return False
+    print name + ": ok"
+    return True
+
+
+def _checkSame(name, script, expected):
+    '''
+        Prints whether script is exactly expected.
+    :return: True if it is
+    '''
+    if (script != expected):
+        print name + ": FAILED"
+        print "    expected:\n" + expected
+        print "    got:\n" + script
+        return False
+    print name + ": ok"
+    return True
+
+
+def _checkError(name, errorClass, function, *args):
+    '''
+        Prints whether function(*args) raises errorClass.
+    :return: True if it does
+    '''
+    try:
+        function(*args)
+    except errorClass as e:
+        print name + ": ok (" + str(e) + ")"
         return True
+    print name + ": FAILED, " + errorClass.__name__ + " not raised"
+    return False
+
+
+def _checkWarnings(name, expected, function, *args):
+    '''
+        Prints whether function(*args) writes every line of expected to stderr, or nothing if expected is empty.
+    :return: (True if it does, the value returned by function)
+    '''
+    import StringIO
+    stderr = sys.stderr
+    sys.stderr = StringIO.StringIO()
+    try:
+        value = function(*args)
+    finally:
+        written = sys.stderr.getvalue()
+        sys.stderr = stderr
+    missing = [x for x in expected if x not in written]
+    if (missing or (not expected and written)):
+        print name + ": FAILED, stderr was \"" + written + "\""
+        return (False, value)
+    print name + ": ok"
+    return (True, value)
 
 if __name__ == "__main__":
     # run unit test
     test = script_scheduler_writer("")
-    test.unitTest()
+    if (test.unitTest()):
+        print "The test was successful."
+    else:
+        print "The test failed."
+        sys.exit(1)
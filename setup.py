@@ -0,0 +1,16 @@
+'''
+Installs the translator modules and the translate-script command: python setup.py install
+'''
+from distutils.core import setup
+
+setup(
+    name="scheduler_translator",
+    version="0.1",
+    description="Translates job scripts between schedulers (UGE, SLURM, and PBS and LSF as output) and a standard syntax",
+    author="Michel Wan Der Maas Soares",
+    author_email="mwandermaassoares@lbl.gov",
+    py_modules=["script_scheduler_writer", "script_ir", "scheduler_uge", "scheduler_slurm", "scheduler_pbs",
+                "scheduler_lsf", "translate_script", "translate_cache", "translate_server", "translate_profile"],
+    # a plain script instead of a setuptools entry point, whose wrapper imports pkg_resources on every run
+    scripts=["bin/translate-script"],
+)
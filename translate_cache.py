@@ -0,0 +1,124 @@
+'''
+Cache of translated scripts, keyed by a hash of everything the translation depends on.
+
+The first tier is an in-memory LRU bounded by maxEntries. The optional second tier is a directory on disk, shared by
+every process given the same directory: each script is a file named after its key, written to a temporary file and
+renamed, so readers never see a partial script. Both tiers are best-effort, an unreadable or unwritable entry is
+just a miss.
+'''
+
+import collections
+import errno
+import hashlib
+import os
+import tempfile
+import threading
+
+# part of every key: bump it whenever a change of the translator changes its output for the same input, so that the
+# scripts cached on disk by an older version are not returned any more
+FORMAT_VERSION = 7
+
+
+class TranslationCache:
+    def __init__(self, maxEntries=1024, directory=None):
+        '''
+        :param maxEntries: number of scripts kept in memory, 0 disables the memory tier
+        :param directory: directory of the disk tier, None disables it
+        '''
+        self.maxEntries = maxEntries
+        self.directory = directory
+        self.entries = collections.OrderedDict()  # least recently used first
+        self.lock = threading.Lock()  # the translation server shares a cache between threads
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, script, scheduler_in, scheduler_out, force, ignore, name, options=()):
+        '''
+        :param script: the input, a list of lines
+        :param options: names of the other options changing the translation, e.g. ("reduce-deps",)
+        :return: the key of a translation
+        '''
+        digest = hashlib.sha1()
+        digest.update("format " + str(FORMAT_VERSION) + "\0")
+        for x in (scheduler_in, scheduler_out, str(bool(force)), str(bool(ignore)), name):
+            digest.update(x + "\0")
+        if (options):
+            digest.update("options " + " ".join(sorted(options)) + "\0")
+        digest.update(str(len(script)) + "\0")  # so that lines cannot be mistaken for the fields above
+        for line in script:
+            digest.update(line + "\0")
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        '''
+        :return: the translated script, or None
+        '''
+        with self.lock:
+            script = self.entries.get(key)
+            if (script is not None):
+                del self.entries[key]
+                self.entries[key] = script
+                self.hits += 1
+                return script
+        if (self.directory is not None):
+            try:
+                with open(self._path(key)) as f:
+                    script = f.read()
+            except (IOError, OSError):
+                script = None
+        with self.lock:
+            if (script is None):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.diskHits += 1
+        self._remember(key, script)
+        return script
+
+    def put(self, key, script):
+        self._remember(key, script)
+        if (self.directory is not None):
+            try:
+                self._write(key, script)
+            except (IOError, OSError):
+                pass
+
+    def _remember(self, key, script):
+        if (self.maxEntries <= 0):
+            return
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = script
+            while (self.entries.__len__() > self.maxEntries):
+                self.entries.popitem(False)
+                self.evictions += 1
+
+    def _write(self, key, script):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if (e.errno != errno.EEXIST):
+                raise
+        fd, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(script)
+            os.rename(temporary, path)
+        except:
+            os.unlink(temporary)
+            raise
+
+    def stats(self):
+        '''
+        :return: dictionary with the counters of the cache
+        '''
+        with self.lock:
+            return {"hits": self.hits, "diskHits": self.diskHits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": self.entries.__len__()}
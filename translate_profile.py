@@ -0,0 +1,133 @@
+'''
+Per-stage timing of the translation, enabled with translate_script.py --profile or TRANSLATOR_PROFILE=1.
+
+enable() replaces the methods listed in STAGES with wrappers counting their calls and wall time, disable() puts the
+original methods back. Nothing is wrapped until enable() is called, so there is no cost when profiling is off.
+For each stage, the report gives the total time and the self time, which leaves out the time spent in other stages
+called from it. The line translating methods are also split by the kind of line, see translator._translateStandardLine.
+'''
+
+import sys
+import time
+import threading
+import functools
+import script_scheduler_writer
+import translate_script
+
+# (class, methods timed, methods also split by the value they return), the translator class can be replaced, see enable
+STAGES = [
+    (translate_script.translator, ["getScript", "writeTo", "stream", "_translate", "_finishHeader", "_parseUGECommand",
+                                   "_parseUGEdependencies", "_parseOptions", "_parseSLURMdependencies"],
+     ["_translateStandardLine", "_translateUGELine", "_translateSLURMLine"]),
+    (script_scheduler_writer.script_scheduler_writer, ["getScript", "writeTo", "writeHeader", "flushCommands", "addJob",
+                                                       "addJobSpec", "addLine", "addLineParsed", "addEmailSpec",
+                                                       "addDefaultConfig", "_parseCommand", "readCommand",
+                                                       "_writeCommand", "readDependency", "_getDependencyString"],
+     []),
+]
+
+if (sys.platform == "win32"):
+    _clock = time.clock
+else:
+    _clock = time.time
+
+_stats = {}  # stage: [calls, total time, self time]
+_lock = threading.Lock()
+_local = threading.local()  # stack of the time spent in the stages called by each running stage
+_originals = []
+
+
+def _record(name, elapsed):
+    stack = _local.stack
+    children = stack.pop()
+    with _lock:
+        stat = _stats.get(name)
+        if (stat is None):
+            stat = _stats[name] = [0, 0.0, 0.0]
+        stat[0] += 1
+        stat[1] += elapsed
+        stat[2] += elapsed - children
+    if (stack):
+        stack[-1] += elapsed
+
+
+def _wrap(name, function, byResult):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_local, "stack", None)
+        if (stack is None):
+            stack = _local.stack = []
+        stack.append(0.0)
+        start = _clock()
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        finally:
+            if (byResult and result is not None):
+                _record(name + " " + str(result), _clock() - start)
+            else:
+                _record(name, _clock() - start)
+    return wrapper
+
+
+def enable(translatorClass=None):
+    '''
+    :param translatorClass: the translator class to time, when translate_script runs as __main__ it is not the one
+                            imported here
+    '''
+    if (_originals):
+        return
+    for cls, methods, methodsByResult in STAGES:
+        if (translatorClass is not None and cls is translate_script.translator):
+            cls = translatorClass
+        for method in methods + methodsByResult:
+            function = cls.__dict__[method]
+            _originals.append((cls, method, function))
+            setattr(cls, method, _wrap(cls.__name__ + "." + method, function, method in methodsByResult))
+
+
+def disable():
+    while (_originals):
+        cls, method, function = _originals.pop()
+        setattr(cls, method, function)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def getStats():
+    '''
+    :return: dictionary of stage: (calls, total seconds, self seconds)
+    '''
+    with _lock:
+        return dict((name, tuple(stat)) for name, stat in _stats.items())
+
+
+def report(fileobj):
+    '''
+        Writes the table of the stages to fileobj, the ones with the largest self time first.
+    '''
+    stats = getStats()
+    fileobj.write("%-58s %9s %11s %11s %11s\n" % ("stage", "calls", "total s", "self s", "usec/call"))
+    for name, (calls, total, own) in sorted(stats.items(), key=lambda x: -x[1][2]):
+        fileobj.write("%-58s %9d %11.4f %11.4f %11.2f\n" % (name, calls, total, own, total * 1e6 / calls))
+
+
+def run(function, statsFile=None, translatorClass=None):
+    '''
+        Calls function with the stages timed, and with cProfile if statsFile is given (read it with pstats).
+    :param translatorClass: see enable
+    :return: what function returns
+    '''
+    enable(translatorClass)
+    if (statsFile is None):
+        return function()
+    import cProfile
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function)
+    finally:
+        profile.dump_stats(statsFile)
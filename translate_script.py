@@ -3,29 +3,172 @@
 Author: Michel Wan Der Maas Soares (mwandermaassoares@lbl.gov)
 '''
 import script_scheduler_writer
+import script_ir
 import sys
+import os
+import array
+import bisect
+import fnmatch
+import re
+# glob, multiprocessing, socket and translate_cache are imported by the modes using them, to keep the startup short
+
+UGE_COMMANDS = ["-N", "-pe", "-l", "-t"]  # commands currently supported
+INPUT_SCHEDULERS = ["UGE", "SLURM"]  # schedulers whose scripts can be translated, the others are only written
+UGE_DEPENDENCIES = ["-hold_jid", "-hold_jid_ad"]
+# the options of qsub and sbatch supported are the ones of the UGE and SLURM backends, see translator._parseOptions
+_SPECIAL_OPTIONS = ("DEPEND", "DEPEND_ARRAY", "EMAIL", "EMAIL_TYPE")  # options read by the translator itself
+
+_WORDS = re.compile(r"""(?:[^\s'"]+|'[^']*'|"(?:[^"\\]|\\.)*"|['"])+""")  # words of a shell line, with their quotes
+# job line of a Slurm script: sbatch ..., or VARIABLE=$(sbatch ...) or VARIABLE=`sbatch ...` keeping the id of the job
+_SLURM_JOB = re.compile(r"\s*(?:([A-Za-z_]\w*)=(\$\(|`)\s*)?sbatch(?=\s|$)")
+_VARIABLE = re.compile(r"\$(?:([A-Za-z_]\w*)|\{([A-Za-z_]\w*)\})$")
+
+# errors raised on bad input, see script_scheduler_writer.TranslationError
+TranslationError = script_scheduler_writer.TranslationError
+UnsupportedScheduler = script_scheduler_writer.UnsupportedScheduler
+UnknownDirective = script_scheduler_writer.UnknownDirective
+InvalidDependency = script_scheduler_writer.InvalidDependency
+UnavailableKeyword = script_scheduler_writer.UnavailableKeyword
+ConflictingEmailTypes = script_scheduler_writer.ConflictingEmailTypes
+
+
+class _JobNameIndex:
+    '''
+        Jobs launched so far by a script, looked up by name for -hold_jid.
+        Exact names are found in a dict, wildcards (name*) in a sorted list of the names.
+    '''
+    def __init__(self):
+        self.jobs = {}  # name: list of job numbers (starting at 1) with that name
+        self.names = []  # distinct names, sorted
+        self.size = 0
+
+    def add(self, name, job):
+        name = name.replace("\"", "")
+        self.size += 1
+        if (name not in self.jobs):
+            self.jobs[name] = []
+            bisect.insort(self.names, name)
+        self.jobs[name].append(job)
+
+    def find(self, name):
+        '''
+        :param name: job name, it may contain wildcards
+        :return: sorted list of the numbers of the jobs matching name. For a name without wildcards, the jobs with
+                 that exact name or, if there are none, the jobs whose name starts with it.
+        '''
+        name = name.replace("\"", "")
+        if (name == ""):
+            return []
+        magic = [name.find(c) for c in "*?[" if c in name]
+        if (not magic):
+            if (name in self.jobs):
+                return self.jobs[name]
+            prefix = name
+        else:
+            prefix = name[:min(magic)]
+        jobs = []
+        for n in self.names[bisect.bisect_left(self.names, prefix):]:
+            if (not n.startswith(prefix)):
+                break
+            if (not magic or fnmatch.fnmatchcase(n, name)):
+                jobs.extend(self.jobs[n])
+        return sorted(jobs)
 
 
 class translator:
-    def __init__(self, script, scheduler_in, scheduler_out, force=False, ignore=False, name="Name"):
+    def __init__(self, script, scheduler_in, scheduler_out, force=False, ignore=False, name="Name", cache=None,
+                 reduceDependencies=False, collapseArrays=False):
+        '''
+        :param cache: translate_cache.TranslationCache consulted by getScript, or None
+        :param reduceDependencies: write only the dependencies not implied by the others, see
+                                   script_scheduler_writer.reduceDependencies
+        :param collapseArrays: submit runs of jobs differing in one argument as job arrays, see
+                               script_scheduler_writer.collapseArrays
+        '''
         self.scriptWriter = script_scheduler_writer.script_scheduler_writer(scheduler_out, name)
+        self.scriptWriter.reduceDependencies = reduceDependencies
+        self.scriptWriter.collapseArrays = collapseArrays
         self.originalScript = script
         self.scheduler_in = scheduler_in
         self.scheduler_out = scheduler_out
         self.force = force
         self.ignore = ignore
-        self.listAvailUGECommands = ["-N", "-pe", "-l", "-t"]  # commands currently supported
-        self.listAvailUGEDepend = ["-hold_jid", "-hold_jid_ad"]
+        self.listAvailUGECommands = list(UGE_COMMANDS)
+        self.listAvailUGEDepend = list(UGE_DEPENDENCIES)
+        self.cache = cache
+        self.ownScript = False  # whether originalScript can be extended by appendLines
+        self._resetTranslation()
+
+    def _resetTranslation(self):
+        self.translateLine = None  # set when the translation starts, see _startTranslation
+        self.translatedLines = 0  # lines of originalScript already in scriptWriter
+        self.headerMark = None  # lengths of the header lists before _finishHeader, None while the header is open
+        self.script = None  # the script written by scriptWriter, until more lines are translated
 
     def _inputScript(self, script):
         self.originalScript = script
+        self.ownScript = False
+        if (self.translateLine is not None):  # the writer holds the translation of the previous input
+            previous = self.scriptWriter
+            self.scriptWriter = script_scheduler_writer.script_scheduler_writer(self.scheduler_out, previous.name)
+            self.scriptWriter.reduceDependencies = previous.reduceDependencies
+            self.scriptWriter.collapseArrays = previous.collapseArrays
+        self._resetTranslation()
+
+    def appendLines(self, lines):
+        '''
+            Adds lines to the end of the input. The next getScript translates only the lines added since the last one.
+        '''
+        if (not self.ownScript):
+            self.originalScript = list(self.originalScript)
+            self.ownScript = True
+        self.originalScript.extend(lines)
 
     def getScript(self):
+        '''
+            The input is translated only once, calling getScript again returns the same script. With a cache, a script
+            translated before is returned without translating it again. The warnings about ignored commands are only
+            written when the script is translated.
+        '''
+        if (self.cache is None):
+            self._translate()
+            if (self.script is None):
+                self.script = self.scriptWriter.getScript()
+            return self.script
+        key = self.cache.key(self.originalScript, self.scheduler_in, self.scheduler_out, self.force, self.ignore,
+                             self.scriptWriter.name, self._outputOptions())
+        script = self.cache.get(key)
+        if (script is None):
+            self._translate()
+            script = self.scriptWriter.getScript()
+            self.cache.put(key, script)
+        return script
+
+    def _outputOptions(self):
+        '''
+        :return: the options changing the translated script besides the arguments of the constructor, for the cache key
+        '''
+        options = []
+        if (self.scriptWriter.reduceDependencies):
+            options.append("reduce-deps")
+        if (self.scriptWriter.collapseArrays):
+            options.append("collapse-arrays")
+        return tuple(options)
+
+    def writeTo(self, fileobj):
+        '''
+            Translate and stream the script to fileobj, see script_scheduler_writer.writeTo
+        '''
+        if (self.cache is not None):
+            fileobj.write(self.getScript())
+            return
         self._translate()
-        return self.scriptWriter.getScript()
+        self.scriptWriter.writeTo(fileobj)
 
     def _parseUGECommand(self, command, force = False):
         '''
+            Translates the options found in a line of the script that is not a job or a directive, see _parseOptions
+            for those.
         :param command: command to be parsed
         :return: command parsed
         '''
@@ -34,249 +177,483 @@ class translator:
                 This function is the inverse of parseCommand, and it was written basically swapping the 1st and 2nd argument
                 of the replace function. It assumes the original script is correct, so there isn`t any error checking.
         '''
-
         if (self.ignore == True):
+            mode = "ignore"
+        elif (self.force == False and force == False):
+            mode = ""
+        else:
+            mode = "force"
+        key = ("UGE", mode, command)  # see script_scheduler_writer.lineMemo
+        entry = script_scheduler_writer.lineMemo.get(key)
+        if (entry is None):
+            entry = self._parseUGECommandWords(command, mode)
+            script_scheduler_writer.lineMemo.put(key, entry)
+        for x in entry[1]:
+            sys.stderr.write(x)
+        return entry[0]
+
+    def _parseUGECommandWords(self, command, mode):
+        '''
+            Body of _parseUGECommand, without the memo.
+        :param mode: "ignore", "force" or ""
+        :return: (command parsed, list of warnings)
+        '''
+        warnings = []
+        if (mode == "ignore"):
             for x in command.split():
                 if (x.startswith("-") and (x not in self.listAvailUGECommands and x not in self.listAvailUGEDepend)):
-                    sys.stderr.write("Command \"" + x + "\" not supported. Deleted.\n")
+                    warnings.append("Command \"" + x + "\" not supported. Deleted.\n")
                     command = command.replace(x, "")
-        elif (self.force == False and force == False):
+        elif (mode == ""):
             for x in command.split():
                 if (x.startswith("-") and (x not in self.listAvailUGECommands and x not in self.listAvailUGEDepend)):
-                    sys.stderr.write("Command \"" + x + "\" not supported. Use --helpUGE to see all the supported commands or --force to ignore unknown commands.\n")
-                    exit(1)
+                    raise UnknownDirective("Command \"" + x + "\" not supported. Use --helpUGE to see all the supported commands or --force to ignore unknown commands.", x)
 
 # TW: Assumes single whitespaces.
 # TW: Terminal "-l" replacement seems very generic, wildcardy?
-        command = command.replace("-N ", "JOB_NAME ", 1)  # replace the first occurrance
+        # replace the first occurrence of each option, see "standard" in script_scheduler_writer.SCHEDULERS
+        return (script_scheduler_writer.getSchedulerTable("UGE").toStandard(command), warnings)
 
-        command = command.replace("-pe pe_slots ", "RESOURCE_NODES ", 1)
-
-        command = command.replace("-l infiniband.c=1", "RESOURCE_IB", 1)
-
-        command = command.replace("-l exclusive.c", "RESOURCE_EXCLUSIVE", 1)
-
-        command = command.replace("-t ", "JOB_ARRAY ", 1)
-
-        command = command.replace("$SGE_TASK_ID", "TASK_ID", 1)
-
-        command = command.replace("-l ram.c=", "RESOURCE_MEM ", 1)
-
-        command = command.replace("-l", "RESOURCE_PRIOR", 1)
-
-        return command
-
-    def _parseUGEdependencies(self, dependencies, type, nameJobs):
+    def _parseUGEdependencies(self, dependencies, type, jobNames):
         '''
         :param dependencies: the word following -hold_jid or -hold_jid_ad
-        :return:
+        :param type: "SINGLE" or "ARRAY"
+        :param jobNames: _JobNameIndex with the jobs launched so far
+        :return: script_ir.Dependency, or None if every dependency was ignored
         '''
-        retString = ""
         dependencies = dependencies.split(",")  # separate dependencies
         depJobId = []
         depJobList = []
-        depJobIdArray = []
-        depJobListArray = []
         for d in dependencies:
             if (d.startswith("$")):  # ignore, it is an enviroment variable
-                if (type == "ARRAY"):
-                    depJobIdArray.append(d)
+                depJobId.append(d)
+                continue
+            jobs = jobNames.find(d)  # check if it the name of jobs launched so far
+            if (jobs):
+                depJobList.extend(jobs)
+            elif (d.isdigit()):  # check if it made of numbers only, treat it as a job_id
+                depJobId.append(int(d))
+            elif (not self.ignore):  # it is probably the name of some other job, and this is not allowed in SLURM.
+                raise InvalidDependency("Invalid dependency: \"" + d + "\". Keep in mind names of jobs launched in other scripts are not allowed. See --helpUGE for options.", d)
+            else:
+                sys.stderr.write("Dependency \"" + d + "\" ignored.\n")
+        return self._getDependency(depJobId, depJobList, type == "ARRAY")
+
+    def _getDependency(self, depJobId, depJobList, byTask, type=""):
+        '''
+        :param depJobId: ids of jobs from outside the script, or variables holding them
+        :param depJobList: numbers of jobs of the script
+        :param byTask: True if the tasks of the job depend on the same tasks of the jobs
+        :param type: dependency type, see script_ir.Dependency
+        :return: script_ir.Dependency on all of the jobs, or None if there are none
+        '''
+        depJobList = sorted(set(depJobList))
+        if (depJobId):  # a dependency has a single type, refer to the jobs by their id variables
+            depJobId += [self.scriptWriter.getJobVariable(n) for n in depJobList]
+            return script_ir.Dependency("JOB_ID", tuple(depJobId), byTask, type)
+        if (depJobList):
+            return script_ir.Dependency("JOB_NUM", array.array("i", depJobList), byTask, type)
+        return None
+
+    def _parseOptions(self, scheduler, command, header=False):
+        '''
+            Reads the options of the launcher at the start of command into items of the standard syntax in a single
+            pass over its words, looking each one up once in the options of the backend of scheduler. The options end
+            at the first word that is not one, the script of the job, whose words are only searched for the task id
+            variables.
+        :param command: the words following the launcher, or the directive if header is set
+        :param header: True for a directive line (#SBATCH, #$), whose words are all options, up to a comment
+        :return: (tuple of script_ir.ResourceRequest and runs of other words, see script_scheduler_writer.readCommand,
+                 {option: argument}) where the options are DEPEND and DEPEND_ARRAY for a job, EMAIL and EMAIL_TYPE
+                 for a header line
+        '''
+        if (self.ignore == True):
+            mode = "ignore"
+        elif (self.force == False):
+            mode = ""
+        else:
+            mode = "force"
+        key = (scheduler, mode, header, command)  # see script_scheduler_writer.lineMemo
+        entry = script_scheduler_writer.lineMemo.get(key)
+        if (entry is None):
+            entry = self._parseOptionsWords(script_scheduler_writer.getSchedulerTable(scheduler), command, mode, header)
+            script_scheduler_writer.lineMemo.put(key, entry)
+        for x in entry[1]:
+            sys.stderr.write(x)
+        return entry[0]
+
+    def _parseOptionsWords(self, table, command, mode, header):
+        '''
+            Body of _parseOptions, without the memo.
+        :param mode: "ignore", "force" or ""
+        :return: ((items, {option: argument}), list of warnings)
+        '''
+        options = table.options
+        special = ("DEPEND", "DEPEND_ARRAY")
+        if (header):
+            special = ("EMAIL", "EMAIL_TYPE")
+        request = script_ir.ResourceRequest
+        taskIdRegex = table.taskIdRegex
+        words = _WORDS.findall(command)
+        numWords = words.__len__()
+        warnings = []
+        items = []
+        keywords = set()  # only the first occurrence of a keyword is kept, as in script_scheduler_writer.readCommand
+        found = {}
+        x = 0
+        while (x < numWords):
+            word = words[x]
+            if (not word.startswith("-") or word == "-"):
+                break
+            start = x
+            x += 1
+            arguments = []
+            entry = options.get(word)
+            if (entry is None and table.joinedArguments):  # --option=argument or -Oargument
+                if (word.startswith("--")):
+                    name, equal, argument = word.partition("=")
+                    if (equal):
+                        arguments.append(argument)
                 else:
-                    depJobId.append(d)
+                    name, argument = word[:2], word[2:]
+                    arguments.append(argument)
+                entry = options.get(name)
+            while (entry is not None and arguments.__len__() < entry[1] and x < numWords):
+                arguments.append(words[x])
+                x += 1
+            if (entry is None or entry[0] is None or arguments.__len__() != entry[1]
+                    or (entry[0] in _SPECIAL_OPTIONS and entry[0] not in special)):
+                self._unknownOption(table, " ".join(words[start:x]), mode, items, warnings)
+                continue
+            keyword, numArguments, convert = entry
+            item = tuple(arguments)
+            if (convert is not None):
+                item = convert(*arguments)
+                if (item is None):  # no standard keyword for these arguments
+                    self._unknownOption(table, " ".join(words[start:x]), mode, items, warnings)
+                    continue
+                if (item.__class__ is not request):
+                    item = (item,)
+            if (keyword in special):
+                found[keyword] = item[0]
                 continue
-            else:  # check if it the name of a job launched so far
-                nameFound = False
-                for n in range(0, nameJobs.__len__()):
-                    x = nameJobs[n]
-                    name = d.replace("\"", "")
-                    name = name.replace("*", "")
-                    if d == x[0]:
-                        if (type == "ARRAY"):
-                            depJobListArray.append(nameJobs[n][1])
-                            nameFound = True
-                            break
-                        else:
-                            depJobList.append(nameJobs[n][1])
-                            nameFound = True
-                            break
-                    elif (x[0].startswith(name)):
-                        if (type == "ARRAY"):
-                            depJobListArray.append(nameJobs[n][1])
-                            nameFound = True
-                            break
-                        else:
-                            depJobList.append(nameJobs[n][1])
-                            nameFound = True
-                            break
-                if (nameFound):
+            if (item.__class__ is not request):
+                if (keyword == ""):
+                    continue
+                item = request(keyword, item)
+            if (taskIdRegex is not None and item[1]):
+                item = request(item[0], tuple([taskIdRegex.sub("TASK_ID", w) for w in item[1]]))
+            if (item[0] not in keywords):
+                keywords.add(item[0])
+                items.append(item)
+        if (not header):
+            if (x < numWords):
+                program = " ".join(words[x:])
+                if (taskIdRegex is not None):
+                    program = taskIdRegex.sub("TASK_ID", program)
+                items.append(program)
+        else:
+            for word in words[x:]:
+                if (word.startswith("#")):  # comment at the end of the line
                     break
-            if (d.isdigit()):  # check if it made of numbers only, treat it as a job_id
-                if (type == "ARRAY"):
-                    depJobIdArray.append(d)
+                self._unknownOption(table, word, mode, items, warnings)
+        return ((tuple(items), found), warnings)
+
+    def _unknownOption(self, table, option, mode, items, warnings):
+        '''
+            Deletes option, keeps it in items or raises UnknownDirective, depending on mode.
+        '''
+        if (mode == "ignore"):
+            warnings.append("Command \"" + option + "\" not supported. Deleted.\n")
+        elif (mode == ""):
+            raise UnknownDirective("Command \"" + option + "\" not supported. Use --help" + table.name + " to see all the supported commands or --force to ignore unknown commands.", option)
+        else:
+            items.append(option)
+
+    def _parseSLURMdependencies(self, dependencies):
+        '''
+        :param dependencies: the argument of --dependency, e.g. afterok:$JOB_A:$JOB_B,afterok:1234
+        :return: script_ir.Dependency, or None if every dependency was ignored
+        '''
+        types = script_scheduler_writer.getSchedulerTable("SLURM").dependencyTypes
+        depJobId = []
+        depJobList = []
+        kind = None  # (dependency type, by task), the same for every job
+        if ("?" in dependencies):  # any of the jobs, the standard syntax waits for all of them
+            self._invalidSLURMDependency(dependencies)
+            return None
+        for d in dependencies.split(","):
+            words = d.split(":")
+            if (words[0] not in types or words.__len__() < 2 or (kind is not None and types[words[0]] != kind)):
+                self._invalidSLURMDependency(d)
+                continue
+            kind = types[words[0]]
+            for job in words[1:]:
+                variable = _VARIABLE.match(job)
+                if (variable is not None and (variable.group(1) or variable.group(2)) in self.jobVariables):
+                    depJobList.append(self.jobVariables[variable.group(1) or variable.group(2)])  # a job of this script
+                elif (variable is not None):  # ignore, it is an enviroment variable
+                    depJobId.append(job)
+                elif (job.isdigit()):
+                    depJobId.append(int(job))
                 else:
-                    depJobId.append(d)
-            elif (not self.ignore):  # it is probably the name of some other job, and this is not allowed in SLURM. Exit with error.
-                sys.stderr.write("Invalid dependency: \"" + d + "\". Keep in mind names of jobs launched in other scripts are not allowed. See --helpUGE for options.\n")
-                sys.exit(1)
-            else:
-                sys.stderr.write("Dependency \"" + d + "\" ignored.\n")
-        if (depJobId.__len__() > 0):
-            retString += "JOB_ID " + ",".join(depJobId)
-        if (depJobList.__len__() > 0):
-            retString += "JOB_LIST " + ",".join(depJobList)
-        if (depJobIdArray.__len__() > 0):
-            retString += "JOB_ID_ARRAY " + ",".join(depJobId)
-        if (depJobListArray.__len__() > 0):
-            retString += "JOB_LIST_ARRAY " + ",".join(depJobList)
-        return retString
-
-    def _parseUGEEmail(self, type):
-        ret = ""
-        if (type == ""):
-            return ret
-        if (type == "n"):
-            ret = "NEVER "
-            return ret
-        if ("a" in type and "e" in type):
-            ret = "ALWAYS "
-            return ret
-        if ("b" in type):
-            ret += "START "
-        if ("e" in type):
-            ret += "END "
-        if ("a" in type):
-            ret += "ABORT"
-        if ("s" in type):
-            ret += "SUSPENDED"
-        return ret
+                    self._invalidSLURMDependency(job)
+        if (kind is None):
+            return None
+        return self._getDependency(depJobId, depJobList, kind[1], kind[0])
 
-    def _translate(self):
+    def _invalidSLURMDependency(self, dependency):
+        if (not self.ignore):
+            raise InvalidDependency("Invalid dependency: \"" + dependency + "\". Only " + ", ".join(sorted(script_scheduler_writer.getSchedulerTable("SLURM").dependencyTypes)) + " on all of the jobs are supported, without time delays. See --helpSLURM for options.", dependency)
+        sys.stderr.write("Dependency \"" + dependency + "\" ignored.\n")
+
+    def _startTranslation(self):
+        '''
+            Resets the state kept while the lines of the script are translated.
+        :return: the function translating one line of the input, see _translateStandardLine
+        '''
         if (self.scheduler_out not in self.scriptWriter.schedulersSupported):
-            sys.stderr.write("Scheduler not supported.")
-            sys.exit(1)
+            raise UnsupportedScheduler("Scheduler not supported.", self.scheduler_out)
+        self.email = ""
+        self.emailType = ""
+        self.defaultItems = []  # items of the directive lines, see _parseOptions
+        self.jobNames = _JobNameIndex()
+        self.jobVariables = {}  # variable of the script holding the id of a job: number of the job
         if (self.scheduler_in == ""):  # direct translation from standard syntax to the scheduler
-            self.scriptWriter.scheduler = self.scheduler_out
-            for line in self.originalScript:
-                auxLine = line.split()  # remove whitespaces and newlines
-                space = " "
-                if (not auxLine):
-                    continue
-                if (auxLine[0].upper() == "SHELL"):
-                    auxLine.pop(0)
-                    self.scriptWriter.setShell(space.join(auxLine))
-                elif (auxLine[0].upper() == "COMMENT"):
-                    auxLine.pop(0)
-                    self.scriptWriter.addComment(space.join(auxLine))
-                elif (auxLine[0].upper() == "EMAIL"):
-                    auxLine.pop(0)
-                    self.scriptWriter.addEmail(auxLine[0], auxLine[1])
-                elif (auxLine[0].upper() == "DEFAULT_CONFIG"):
-                    auxLine.pop(0)
-                    self.scriptWriter.setDefaultConfig(space.join(auxLine))
-                elif (auxLine[0].upper() == "JOB"):
-                    auxLine.pop(0)
-                    newString = space.join(auxLine)
-                    index = newString.find("DEPEND")
-                    if (index == -1):
-                        self.scriptWriter.addJob(newString)
-                    else:
-                        newString = newString.split("DEPEND ")
-                        if (newString[1].find("DEPEND_TYPE") != -1):
-                            newString[1] = newString[1].split("DEPEND_TYPE")
-                            self.scriptWriter.addJob(newString[0], newString[1][0], newString[1][1])
-                        else:
-                            s = newString[1]
-                            self.scriptWriter.addJob(newString[0], s)
-                elif (auxLine[0].upper() == "LINE"):
-                    auxLine.pop(0)
-                    self.scriptWriter.addLine(space.join(auxLine), True)
-                elif (auxLine[0].upper() == "LINE_PARSED"):
-                    auxLine.pop(0)
-                    self.scriptWriter.addLineParsed(space.join(auxLine))
-                else:
-                    sys.stderr.write("Unknown command: \"" + auxLine[0] + "\". Use --help to see available options.\n")
-                    sys.exit(1)
+            return self._translateStandardLine
         elif (self.scheduler_in == "UGE"):
-            parseCommandFunction = self._parseUGECommand
-            parseDependencyFunction = self._parseUGEdependencies
-            parseEmail = self._parseUGEEmail
-            formatLauncher = "qsub"
-            formatMail = "-M"
-            formatMailType = "-m"
-            formatName = "-N"
-            formatDependency = "-hold_jid"
-            formatDependencyArray = "-hold_jid_ad"
-            formatDefaultConfig = "#$"
-
-            self.scriptWriter.scheduler = self.scheduler_out
-
-            email = ""
-            emailType = ""
-            default_config = ""
-            nameJobs = []
-            for line in self.originalScript:
-                if (line==""):
-                    continue
-                shellIndex = line.find("#!")
-                if (shellIndex != -1):  # setting shell
-                    self.scriptWriter.setShell(line)
-                else:
-                    if (line.startswith(formatDefaultConfig)):  # default_config
-                        auxLine = line.replace("\n","")
-                        if (line.find(formatMail) != -1):  # search for formatMail, if found it is an email header
-                            list = line.split(formatMail+" ")
-                            email = list[1].split()[0]
-                            email = email.replace("\n", "")
-                            auxLine = auxLine.replace(formatMail, "")
-                            auxLine = auxLine.replace(email, "")
-                        if (auxLine.find(formatMailType) != -1):  # search for formatMailType, if found it is an email type header
-                            list = auxLine.split(formatMailType+" ")
-                            emailType = list[1].split()[0]
-                            auxLine = auxLine.replace(emailType, "")
-                            emailType = parseEmail(emailType.replace(" ", ""))
-                            auxLine = auxLine.replace(formatMailType, "")
-                        auxLine = auxLine.replace("\n", "")
-                        #print(auxLine.replace(" ","").replace(formatDefaultConfig, ""))
-                        if (auxLine.replace(" ","").replace(formatDefaultConfig, "") != ""):
-                            default_config += self._parseUGECommand(auxLine.split(formatDefaultConfig)[1])
-                    elif (line[0] == "#"):  # this is a comment
-                        self.scriptWriter.addComment(line)
-                    else:  # either a JOB, LINE or LINE_PARSED
-                        qsubIndex = line.find(formatLauncher)
-                        if (qsubIndex != -1):  # it is a job
-                            line = line.replace(formatLauncher + " ", "LAUNCH ")
-                            if (line.find(formatName)):
-                                name = line.split(formatName)[1].split()[0]  # argument right after formatName, if found
-                                nameJobs.append((name, str(nameJobs.__len__()+1)))
-                            else:
-                                nameJobs.append(("", str(nameJobs.__len__()+1)))
-                            line = parseCommandFunction(line)
-                            # find formatDependency or formatDependencyArray, take it out, get word after the command, parse dependency
-                            if (line.find(formatDependencyArray) != -1):
-                                list = line.split(formatDependencyArray)
-                                dependency = list[1].split()[0]  # first word after formatDependencyArray
-                                line = line.replace(formatDependencyArray, "")
-                                line = line.replace(dependency, "")
-                                dependency = parseDependencyFunction(dependency, "ARRAY", nameJobs)
-                                self.scriptWriter.addJob(line, dependency, "", True)
-                            if (line.find(formatDependency) != -1):
-                                list = line.split(formatDependency)
-                                dependency = list[1].split()[0]  # first word after formatDependency
-                                line = line.replace(formatDependency, "")
-                                line = line.replace(dependency, "")
-                                dependency = parseDependencyFunction(dependency, "SINGLE", nameJobs)
-                                self.scriptWriter.addJob(line, dependency, "", True)
-                            else:
-                                self.scriptWriter.addJob(line, "", "", True)
-                        else:
-                            newLine = parseCommandFunction(line, True)
-                            self.scriptWriter.addLine(newLine)
+            return self._translateUGELine
+        elif (self.scheduler_in == "SLURM"):
+            return self._translateSLURMLine
+        else:
+            raise UnsupportedScheduler("Translation not currently supported.", self.scheduler_in)
+
+    def _finishHeader(self):
+        '''
+            Adds to the writer the header items gathered from the lines translated so far. _reopenHeader takes them out
+            again, so that more lines can be translated.
+        '''
+        self.headerMark = (self.scriptWriter.header.__len__(), self.scriptWriter.defaultHeader.__len__())
+        if (self.scheduler_in == "UGE" or self.scheduler_in == "SLURM"):
             # add email and default configurations
-            self.scriptWriter.addEmail(email, emailType)
-            self.scriptWriter.setDefaultConfig(default_config)
+            self.scriptWriter.addEmail(self.email, self.emailType)
+            self.scriptWriter.addDefaultConfig(script_ir.DefaultConfig(
+                script_scheduler_writer.firstItems(self.defaultItems)))
+
+    def _reopenHeader(self):
+        del self.scriptWriter.header[self.headerMark[0]:]
+        del self.scriptWriter.defaultHeader[self.headerMark[1]:]
+        self.headerMark = None
+
+    def _translate(self):
+        '''
+            Translates the lines of the input not translated yet.
+        '''
+        if (self.headerMark is not None):
+            if (self.translatedLines == self.originalScript.__len__()):
+                return
+            self._reopenHeader()
+        if (self.translateLine is None):
+            self.translateLine = self._startTranslation()
+        self.script = None
+        try:
+            while (self.translatedLines < self.originalScript.__len__()):
+                number = self.translatedLines
+                self._translateLine(self.translateLine, number + 1, self.originalScript[number])
+                self.translatedLines = number + 1
+            self._finishHeader()
+        except:
+            self._inputScript(self.originalScript)  # a line may be half translated, start again on the next call
+            raise
+
+    def _translateLine(self, translateLine, number, line):
+        '''
+            Calls translateLine(line), adding the line number to the errors raised.
+        '''
+        try:
+            return translateLine(line)
+        except TranslationError as e:
+            if (e.line is None):
+                e.line = number
+            raise
+
+    def _translateStandardLine(self, line):
+        '''
+        :return: "HEADER" for lines that only change the header (shell, email, default configuration), "COMMENT" for
+                 comments and empty lines, "BODY" for the other lines
+        '''
+        auxLine = line.split()  # remove whitespaces and newlines
+        space = " "
+        if (not auxLine):
+            return "COMMENT"
+        if (auxLine[0].upper() == "SHELL"):
+            auxLine.pop(0)
+            self.scriptWriter.setShell(space.join(auxLine))
+            return "HEADER"
+        elif (auxLine[0].upper() == "COMMENT"):
+            auxLine.pop(0)
+            self.scriptWriter.addComment(space.join(auxLine))
+            return "COMMENT"
+        elif (auxLine[0].upper() == "EMAIL"):
+            auxLine.pop(0)
+            self.scriptWriter.addEmail(auxLine[0], auxLine[1])
+            return "HEADER"
+        elif (auxLine[0].upper() == "DEFAULT_CONFIG"):
+            auxLine.pop(0)
+            self.scriptWriter.setDefaultConfig(space.join(auxLine))
+            return "HEADER"
+        elif (auxLine[0].upper() == "JOB"):
+            auxLine.pop(0)
+            newString = space.join(auxLine)
+            index = newString.find("DEPEND")
+            if (index == -1):
+                self.scriptWriter.addJob(newString)
+            else:
+                newString = newString.split("DEPEND ")
+                if (newString[1].find("DEPEND_TYPE") != -1):
+                    newString[1] = newString[1].split("DEPEND_TYPE")
+                    self.scriptWriter.addJob(newString[0], newString[1][0], newString[1][1])
+                else:
+                    s = newString[1]
+                    self.scriptWriter.addJob(newString[0], s)
+        elif (auxLine[0].upper() == "LINE"):
+            auxLine.pop(0)
+            self.scriptWriter.addLine(space.join(auxLine), True)
+        elif (auxLine[0].upper() == "LINE_PARSED"):
+            auxLine.pop(0)
+            self.scriptWriter.addLineParsed(space.join(auxLine))
         else:
-            sys.stderr.write("Translation not currently supported.\n")
-            sys.exit(1)
+            raise UnknownDirective("Unknown command: \"" + auxLine[0] + "\". Use --help to see available options.", auxLine[0])
+        return "BODY"
+
+    def _translateUGELine(self, line):
+        '''
+        :return: same as _translateStandardLine
+        '''
+        formatLauncher = "qsub"
+        formatDefaultConfig = "#$"
+
+        if (line==""):
+            return "COMMENT"
+        shellIndex = line.find("#!")
+        if (shellIndex != -1):  # setting shell
+            self.scriptWriter.setShell(line)
+            return "HEADER"
+        if (line.startswith(formatDefaultConfig)):  # default_config and email
+            items, found = self._parseOptions("UGE", line[len(formatDefaultConfig):].replace("\n", ""), True)
+            if ("EMAIL" in found):
+                self.email = found["EMAIL"]
+            if ("EMAIL_TYPE" in found):
+                self.emailType = found["EMAIL_TYPE"]
+            self.defaultItems.extend(items)
+            return "HEADER"
+        if (line[0] == "#"):  # this is a comment
+            self.scriptWriter.addComment(line)
+            return "COMMENT"
+        # either a JOB, LINE or LINE_PARSED
+        qsubIndex = line.find(formatLauncher)
+        if (qsubIndex != -1):  # it is a job
+            prefix = ""  # text before qsub, kept before the launcher of the output scheduler
+            command = line.replace("\n", "")
+            start = command.find(formatLauncher + " ")
+            if (start != -1):
+                prefix, command = command[:start], command[start + len(formatLauncher) + 1:]
+            items, found = self._parseOptions("UGE", command)
+            name = ""
+            for item in items:
+                if (item.__class__ is script_ir.ResourceRequest and item[0] == "JOB_NAME"):
+                    name = item[1][0]
+            dependency = None
+            if ("DEPEND_ARRAY" in found):
+                dependency = self._parseUGEdependencies(found["DEPEND_ARRAY"], "ARRAY", self.jobNames)
+            elif ("DEPEND" in found):
+                dependency = self._parseUGEdependencies(found["DEPEND"], "SINGLE", self.jobNames)
+            self.scriptWriter.addJobSpec(script_ir.Job(items, dependency, prefix))
+            self.jobNames.add(name, self.jobNames.size + 1)  # after its dependencies, a job cannot hold on itself
+            return "BODY"
+        newLine = self._parseUGECommand(line, True)
+        self.scriptWriter.addLine(newLine)
+        if (line.strip() == ""):
+            return "COMMENT"
+        return "BODY"
+
+    def _translateSLURMLine(self, line):
+        '''
+        :return: same as _translateStandardLine
+        '''
+        if (line.strip() == ""):
+            return "COMMENT"
+        if (line.startswith("#!")):  # setting shell
+            self.scriptWriter.setShell(line)
+            return "HEADER"
+        if (line.startswith("#SBATCH")):  # default_config and email
+            items, found = self._parseOptions("SLURM", line[len("#SBATCH"):].replace("\n", ""), True)
+            if ("EMAIL" in found):
+                self.email = found["EMAIL"]
+            if ("EMAIL_TYPE" in found):
+                self.emailType = found["EMAIL_TYPE"]
+            self.defaultItems.extend(items)
+            return "HEADER"
+        if (line.lstrip().startswith("#")):  # this is a comment
+            self.scriptWriter.addComment(line)
+            return "COMMENT"
+        job = _SLURM_JOB.match(line)
+        variable = None
+        if (job is not None):
+            command = line[job.end():].replace("\n", "")
+            variable = job.group(1)
+            if (variable is not None):  # keep the command up to the end of the substitution, and before any pipe
+                end = command.rfind({"$(": ")", "`": "`"}[job.group(2)])
+                if (end == -1 or command[end + 1:].strip() != ""):
+                    job = None
+                else:
+                    command = command[:end].split("|")[0]
+        if (job is None):
+            if ("sbatch" in line.split()):
+                sys.stderr.write("Line \"" + line.replace("\n", "") + "\" does not start with sbatch, written as it is.\n")
+            taskIdRegex = script_scheduler_writer.getSchedulerTable("SLURM").taskIdRegex
+            taskId = "TASK_ID"
+            if (self.scriptWriter.table is not None):
+                taskId = self.scriptWriter.table.taskId
+            self.scriptWriter.addLine(taskIdRegex.sub(lambda match: taskId, line))
+            return "BODY"
+        items, found = self._parseOptions("SLURM", command)
+        dependency = None
+        if ("DEPEND" in found):
+            dependency = self._parseSLURMdependencies(found["DEPEND"])
+        self.scriptWriter.addJobSpec(script_ir.Job(items, dependency, ""))
+        if (variable is not None):  # the variable keeps holding the id of the job for the rest of the script
+            number = self.scriptWriter.getJobsSize()
+            self.jobVariables[variable] = number
+            if ("$" + variable != self.scriptWriter.getJobVariable(number)):
+                self.scriptWriter.addLine(variable + "=" + self.scriptWriter.getJobVariable(number), True)
+        return "BODY"
+
+    def stream(self, lines, fileobj):
+        '''
+            Translates lines one at a time, writing each translated line to fileobj as soon as it is final.
+            Only the header items (shell, email, default configuration) and the comments around them are held, until
+            the first line of the body. Header items found after that are ignored.
+        :param lines: any iterable of lines, e.g. iter(sys.stdin.readline, "")
+        '''
+        translateLine = self._startTranslation()
+        headerWritten = False
+        for number, line in enumerate(lines, 1):
+            kind = self._translateLine(translateLine, number, line)
+            if (headerWritten):
+                if (kind == "HEADER"):
+                    sys.stderr.write("Header line \"" + line.replace("\n", "") + "\" after the first command. Ignored.\n")
+            elif (kind == "BODY"):
+                self._finishHeader()
+                self.scriptWriter.writeHeader(fileobj)
+                headerWritten = True
+            if (headerWritten):
+                self.scriptWriter.flushCommands(fileobj)
+                fileobj.flush()
+        if (not headerWritten):
+            self._finishHeader()
+            self.scriptWriter.writeHeader(fileobj)
+        self.scriptWriter.flushCommands(fileobj)
 
     def unitTest(self, listOfScripts, verbose = False):
         # TEST AS DIRECT SCRIPT INPUT
@@ -294,8 +671,157 @@ class translator:
                 if(verbose):
                     print script
                 sys.stderr.write("Translation finished.\n")
+        result = True
+        _checkScript = script_scheduler_writer._checkScript
+        _checkError = script_scheduler_writer._checkError
+        _checkSame = script_scheduler_writer._checkSame
+        _checkWarnings = script_scheduler_writer._checkWarnings
+
+        # Test reading Slurm scripts
+        slurmScript = ["#!/bin/bash\n",
+                       "#SBATCH --mail-user=uname@lbl.gov --mail-type=BEGIN,FAIL\n",
+                       "A=$(sbatch --parsable --array=1-10:2 ./prep.sh $SLURM_ARRAY_TASK_ID)\n",
+                       "B=$(sbatch -d aftercorr:$A --array=1,3,5,7,9 ./work.sh)\n",
+                       "sbatch --dependency=afternotok:$A:$B ./cleanup.sh\n",
+                       "echo ${SLURM_ARRAY_TASK_ID}\n"]
+        result &= _checkScript("Slurm to Slurm", translator(slurmScript, "SLURM", "SLURM", name="Test").getScript(),
+                               ["#SBATCH --mail-type=BEGIN,FAIL\n",
+                                "Test_JOB_1=`sbatch  --array=1-10:2 ./prep.sh $SLURM_ARRAY_TASK_ID `",
+                                "Test_JOB_2=`sbatch --dependency=aftercorr:$Test_JOB_1  --array=1-9:2 ./work.sh `",
+                                "Test_JOB_3=`sbatch --dependency=afternotok:$Test_JOB_1:$Test_JOB_2  ./cleanup.sh `",
+                                "A=$Test_JOB_1\n", "echo $SLURM_ARRAY_TASK_ID\n"], ["$SLURM_TASK_ID"])
+        result &= _checkScript("Slurm to UGE", translator(slurmScript, "SLURM", "UGE", name="Test").getScript(),
+                               ["#$ -m ba\n", "Test_JOB_1=`qsub  -t 1:10:2 ./prep.sh $SGE_TASK_ID `",
+                                "Test_JOB_2=`qsub -hold_jid_ad $Test_JOB_1  -t 1:9:2 ./work.sh `",
+                                "echo $SGE_TASK_ID\n"])
+        result &= _checkScript("Slurm to PBS", translator(slurmScript, "SLURM", "PBS", name="Test").getScript(),
+                               ["Test_JOB_2=`qsub -W depend=afterok:$Test_JOB_1  -J 1-9:2 ./work.sh `"],
+                               ["afterany"])  # aftercorr waits for the tasks to succeed
+        memoryScript = ["sbatch --mem=0 ./whole.sh\n", "sbatch --mem=2G ./part.sh\n"]
+        result &= _checkScript("Slurm memory of the node", translator(memoryScript, "SLURM", "SLURM").getScript(),
+                               ["`sbatch  --mem=0 ./whole.sh `", "`sbatch  --mem=2GB ./part.sh `"], ["--mem=1"])
+        result &= _checkScript("Slurm memory of the node to standard",
+                               translator(memoryScript, "SLURM", "").getScript(), ["RESOURCE_MEM 0 ./whole.sh"])
+        result &= _checkError("Slurm memory of the node to UGE", UnavailableKeyword,
+                              translator(memoryScript, "SLURM", "UGE").getScript)
+        result &= _checkError("Slurm array not evenly spaced", UnknownDirective,
+                              translator(["sbatch --array=1,2,4 ./job.sh\n"], "SLURM", "UGE").getScript)
+        result &= _checkError("Slurm array with a limit", UnknownDirective,
+                              translator(["sbatch --array=1-16%4 ./job.sh\n"], "SLURM", "UGE").getScript)
+        result &= _checkError("Slurm dependency on any job", InvalidDependency,
+                              translator(["sbatch -d afterok:1?afterok:2 ./job.sh\n"], "SLURM", "UGE").getScript)
+
+        # Test -hold_jid on the names of earlier jobs with wildcards
+        wildcardScript = ["qsub -N step_a ./a.sh\n", "qsub -N other ./o.sh\n", "qsub -N step_b ./b.sh\n",
+                          "qsub -hold_jid \"step_*\" -N last ./c.sh\n", "qsub -hold_jid \"none_*\" ./d.sh\n"]
+        result &= _checkScript("UGE wildcard dependency",
+                               translator(wildcardScript, "UGE", "UGE", ignore=True, name="Test").getScript(),
+                               ["Test_JOB_4=`qsub -hold_jid $Test_JOB_1,$Test_JOB_3  -N last ./c.sh `",
+                                "Test_JOB_5=`qsub  ./d.sh `"], ["$Test_JOB_2,", "$Test_JOB_4,"])
+        result &= _checkError("UGE wildcard dependency matching no job", InvalidDependency,
+                              translator(wildcardScript, "UGE", "UGE").getScript)
+
+        # Test adding lines to a script already translated
+        appendScript = slurmScript + ["#SBATCH --mem=1G\n", "sbatch -d afterok:$B ./merge.sh\n"]
+        incremental = translator(slurmScript[:3], "SLURM", "UGE", name="Test")
+        incremental.getScript()
+        incremental.getScript()
+        incremental.appendLines(appendScript[3:])
+        result &= _checkSame("Lines added after getScript", incremental.getScript(),
+                             translator(appendScript, "SLURM", "UGE", name="Test").getScript())
+
+        # Test the warnings of a line read again from the memo, see script_scheduler_writer.lineMemo
+        unavailable = "Command RESOURCE_IB not available for SLURM. Ignored.\n"
+        for attempt in ("first", "second"):
+            ok, script = _checkWarnings("Unavailable keyword, " + attempt + " translation", [unavailable],
+                                        translator(["JOB RESOURCE_IB ./job.sh\n"], "", "SLURM").getScript)
+            result &= ok
+
+        # Test the cache: (translations, hits, misses, hits on disk) after each translation of the same script
+        import shutil
+        import tempfile
+        import translate_cache
+        translations = []
+
+        def cachedTranslation(cache):
+            cached = translator(slurmScript, "SLURM", "UGE", name="Test", cache=cache)
+            translate = cached._translate
+
+            def countedTranslate():
+                translations.append(1)
+                translate()
+            cached._translate = countedTranslate
+            script = cached.getScript()
+            stats = cache.stats()
+            return (script, str((translations.__len__(), stats["hits"], stats["misses"], stats["diskHits"])))
+
+        directory = tempfile.mkdtemp()
+        formatVersion = translate_cache.FORMAT_VERSION
+        try:
+            cache = translate_cache.TranslationCache(directory=directory)
+            script, counts = cachedTranslation(cache)
+            result &= _checkSame("Cache miss", counts, str((1, 0, 1, 0)))
+            cachedScript, counts = cachedTranslation(cache)
+            result &= _checkSame("Cache hit in memory", counts, str((1, 1, 1, 0)))
+            result &= _checkSame("Cache hit in memory, script", cachedScript, script)
+            cachedScript, counts = cachedTranslation(translate_cache.TranslationCache(directory=directory))
+            result &= _checkSame("Cache hit on disk", counts, str((1, 1, 0, 1)))
+            result &= _checkSame("Cache hit on disk, script", cachedScript, script)
+            translate_cache.FORMAT_VERSION += 1
+            cachedScript, counts = cachedTranslation(translate_cache.TranslationCache(directory=directory))
+            result &= _checkSame("Cache on disk after a new format version", counts, str((2, 0, 1, 0)))
+        finally:
+            translate_cache.FORMAT_VERSION = formatVersion
+            shutil.rmtree(directory)
+
+        # Test streaming a script, which must give the same script as getScript
+        import StringIO
+        chainScript = ["#!/bin/bash\n", "#SBATCH --mail-user=uname@lbl.gov\n", "A=$(sbatch ./a.sh)\n", "echo $A\n",
+                       "B=$(sbatch -d afterok:$A ./b.sh)\n", "sbatch -d afterok:$A:$B ./c.sh\n"]
+        for reduce in (False, True):
+            streamed = StringIO.StringIO()
+            translator(chainScript, "SLURM", "UGE", name="Test", reduceDependencies=reduce).stream(chainScript,
+                                                                                                   streamed)
+            result &= _checkSame("Stream" + (" with --reduce-deps" if reduce else ""), streamed.getvalue(),
+                                 translator(chainScript, "SLURM", "UGE", name="Test",
+                                            reduceDependencies=reduce).getScript())
+        result &= _checkScript("Stream with --reduce-deps, dependencies", streamed.getvalue(),
+                               ["Test_JOB_3=`qsub -hold_jid $Test_JOB_2  ./c.sh `"])
+
+        # Test that a batch on several processes writes the same files, in the same order, as on one
+        examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+        for s_in, s_out in (("UGE", "SLURM"), ("SLURM", "UGE")):
+            batches = []
+            for jobs in (1, 3):
+                outDir = tempfile.mkdtemp()
+                try:
+                    batch = ""
+                    for inputPath, outputPath, error in translateBatch(
+                            os.path.join(examples, "test-" + s_in + "-*"), outDir, s_in, s_out, True, jobs=jobs):
+                        batch += inputPath + " -> " + os.path.relpath(outputPath, outDir) + ": " + str(error) + "\n"
+                        if (error is None):
+                            with open(outputPath) as f:
+                                batch += f.read()
+                    batches.append(batch)
+                finally:
+                    shutil.rmtree(outDir)
+            result &= _checkSame("Batch of " + s_in + " examples with --jobs 3", batches[1], batches[0])
+        source = tempfile.mkdtemp()
+        try:
+            for directory in ("a", "b"):
+                os.mkdir(os.path.join(source, directory))
+                with open(os.path.join(source, directory, "x.sh"), "w") as f:
+                    f.write("sbatch ./job.sh\n")
+            ok, batch = _checkWarnings("Batch inputs with the same name", ["both hold their job ids in x_JOB_*"],
+                                       translateBatch, source, os.path.join(source, "out"), "SLURM", "UGE")
+            result &= ok
+        finally:
+            shutil.rmtree(source)
+        if (not result):
+            return False
+
         # Test translating from every scheduler to any other
-        for s_in in self.scriptWriter.schedulersSupported:
+        for s_in in INPUT_SCHEDULERS:
             for s_out in self.scriptWriter.schedulersSupported:
                 if (s_in != "" and s_out != "" and s_in != s_out):
                     sys.stderr.write("Translation from "+s_in+" to "+s_out+".\n")
@@ -304,29 +830,44 @@ class translator:
                     if (verbose):
                         print script+"\n\n"
                     sys.stderr.write("Translation finished.\n")
-        return True
+        return result
 
 
-def displayHelp(writer, full=True):
+def displayHelp(writer=None, full=True):
+    '''
+    :param writer: not used, kept for the callers passing a translator
+    '''
     help = \
         "\nThis program takes as input a script, and translate all the scheduler-specific commands to whichever " \
         + "scheduler you would like. Currently it supports: "
     list = []
-    for s in writer.scriptWriter.schedulersSupported:
-        if s != "":
-            list.append(s)
-    help += ",".join(list) + ".\n"
+    for s in script_scheduler_writer.SCHEDULERS:
+        list.append(s)
+    help += ",".join(list) + ", and it reads scripts of " + ",".join(INPUT_SCHEDULERS) + ".\n"
     if (full):
         help += "You can also see specific help for your scheduler using: "
         list = []
-        for s in writer.scriptWriter.schedulersSupported:
-            if s != "":
-                list.append("--help" + s)
+        for s in INPUT_SCHEDULERS:
+            list.append("--help" + s)
         help += ",".join(list) + ".\n"
     help += "\nAuthor: Michel Wan der Maas Soares(mwandermaassoares@lbl.gov)\n\n"
     help += "Options: \n"
     help += "--force: write unknown commands and dependencies\n"
-    help += "--ignore ignore/delete unknown commands and dependencies"
+    help += "--ignore ignore/delete unknown commands and dependencies\n"
+    help += "--batch DIR|GLOB --out DIR: translate every file in DIR (recursively) or matching GLOB, " \
+        + "writing each one to the same relative path under --out\n"
+    help += "--stream: translate stdin to stdout line by line, as soon as each line is read\n"
+    help += "--jobs N: with --batch, translate on N processes (0 uses every CPU)\n"
+    help += "--serve unix:PATH: serve translations on a local socket, see translate_server.py for the protocol\n"
+    help += "--reduce-deps: leave out the dependencies implied by other dependencies of the same job, e.g. on every " \
+        + "earlier job of a chain\n"
+    help += "--collapse-arrays: submit consecutive jobs that only differ in one argument as a single job array, " \
+        + "running the command through the scheduler instead of submitting it as a script\n"
+    help += "--cache-dir DIR: keep the translated scripts in DIR and reuse them for identical inputs\n"
+    help += "--profile: write the time spent in each stage of the translation to stderr (or TRANSLATOR_PROFILE=1)\n"
+    help += "--profile-output FILE: also profile with cProfile, writing the statistics to FILE for pstats\n"
+    help += "\nExit status: 1 usage error, 2 scheduler not supported, 3 unknown command, 4 invalid dependency, " \
+        + "5 command not available for the output scheduler, 6 conflicting email types"
 
     return help+"\n"
 
@@ -335,20 +876,284 @@ def displayUsage():
     sys.stderr.write("Usage: translate_script.py FILE -i SCHEDULER_IN -o SCHEDULER_OUT [options]\n")
     sys.stderr.write("For stdin, please specify 'stdin' instead of FILE.\n")
     sys.stderr.write("If either -s or -o is not specified, it will assume standard syntax. You have to specify one of the two.\n")
+    sys.stderr.write("       translate_script.py --batch DIR|GLOB --out DIR [--jobs N] -i SCHEDULER_IN -o SCHEDULER_OUT [options]\n")
+    sys.stderr.write("       translate_script.py --stream -i SCHEDULER_IN -o SCHEDULER_OUT [options]\n")
+    sys.stderr.write("       translate_script.py --serve unix:PATH\n")
     sys.stderr.write("Use --help to see the available options and schedulers.\n")
 
 
+def displayError(error):
+    '''
+        Reports a TranslationError on the command line.
+    :return: the exit status for the error
+    '''
+    sys.stderr.write(str(error) + "\n")
+    return error.exitCode
+
+
+def _getOption(args, option, description):
+    '''
+    :return: the word following option in args, or None if option is not present
+    '''
+    if (option not in args):
+        return None
+    index = args.index(option)
+    if (index + 1 >= len(args)):
+        sys.stderr.write(description + " not specified\n")
+        displayUsage()
+        sys.exit(1)
+    return args[index + 1]
+
+
+def _scriptName(file):
+    '''
+    :return: the name used for the JobID holders of the translated script, the file name up to its first dot, so
+             ./x.sh and dir/x.sh get the same name
+    '''
+    name = os.path.basename(file).split(".")
+    name = name[0].replace(" ","")
+    return name
+
+
+def _listBatchInputs(source):
+    '''
+    :param source: a directory, walked recursively, or a glob pattern
+    :return: sorted list of (input path, path relative to source) for every file found
+    '''
+    import glob
+    if (os.path.isdir(source)):
+        base = source
+        files = []
+        for root, dirs, names in os.walk(source):
+            dirs.sort()
+            for n in sorted(names):
+                files.append(os.path.join(root, n))
+    else:
+        # the base of a glob is its longest leading path without wildcards
+        base = []
+        for part in os.path.dirname(source).split(os.sep):
+            if (glob.has_magic(part)):
+                break
+            base.append(part)
+        base = os.sep.join(base)
+        files = sorted([f for f in glob.glob(source) if os.path.isfile(f)])
+    return [(f, os.path.relpath(f, base or os.curdir)) for f in files]
+
+
+def _translateFile(inputPath, outputPath, scheduler_in, scheduler_out, force, ignore, cacheDir=None,
+                   reduceDependencies=False, collapseArrays=False):
+    '''
+        Translates a single file of a batch and writes the result to outputPath.
+    :param cacheDir: directory of a translate_cache.TranslationCache shared by the processes of the batch, or None
+    :return: None for success, or a string describing why the file failed
+    '''
+    try:
+        with open(inputPath) as f:
+            inputList = f.readlines()
+        cache = None
+        if (cacheDir is not None):
+            import translate_cache
+            cache = translate_cache.TranslationCache(0, cacheDir)
+        writer = translator(inputList, scheduler_in, scheduler_out, force, ignore, _scriptName(inputPath), cache,
+                            reduceDependencies, collapseArrays)
+        script = None
+        # translate before creating the output, so failed files leave nothing behind
+        if (cache is None):
+            writer._translate()
+        else:
+            script = writer.getScript()
+        outDir = os.path.dirname(outputPath)
+        if (outDir != "" and not os.path.isdir(outDir)):
+            try:
+                os.makedirs(outDir)
+            except OSError:
+                if (not os.path.isdir(outDir)):  # another worker may have just created it
+                    raise
+        with open(outputPath, "w") as f:
+            if (script is None):
+                writer.scriptWriter.writeTo(f)
+            else:
+                f.write(script)
+            f.write("\n")
+    except (IOError, OSError) as e:
+        return str(e)
+    except TranslationError as e:
+        return str(e)
+    except Exception as e:
+        return e.__class__.__name__ + ": " + str(e)
+    return None
+
+
+def _translateTask(task):
+    '''
+        Pool worker: every process builds its own translator for each file it receives.
+    '''
+    inputPath, outputPath, scheduler_in, scheduler_out, force, ignore, cacheDir, reduceDependencies, collapseArrays = \
+        task
+    return (inputPath, outputPath, _translateFile(inputPath, outputPath, scheduler_in, scheduler_out, force, ignore,
+                                                  cacheDir, reduceDependencies, collapseArrays))
+
+
+def iterBatch(source, outDir, scheduler_in, scheduler_out, force=False, ignore=False, jobs=1, cacheDir=None,
+              reduceDependencies=False, collapseArrays=False):
+    '''
+        Same as translateBatch, but yields each result as soon as it is ready, still in input order.
+    '''
+    tasks = []
+    names = {}  # name of the JobID holders: first input using it
+    for inputPath, relPath in _listBatchInputs(source):
+        tasks.append((inputPath, os.path.join(outDir, relPath), scheduler_in, scheduler_out, force, ignore, cacheDir,
+                      reduceDependencies, collapseArrays))
+        name = _scriptName(inputPath)
+        if (name in names):
+            sys.stderr.write("Warning: \"" + inputPath + "\" and \"" + names[name] + "\" both hold their job ids in "
+                             + name + "_JOB_*.\n")
+        else:
+            names[name] = inputPath
+    import multiprocessing
+    if (jobs == 0):
+        jobs = multiprocessing.cpu_count()
+    if (jobs <= 1 or len(tasks) <= 1):
+        for task in tasks:
+            yield _translateTask(task)
+        return
+    pool = multiprocessing.Pool(min(jobs, len(tasks)))
+    try:
+        # imap keeps the input order, so the output does not depend on the number of jobs
+        for result in pool.imap(_translateTask, tasks, len(tasks) // (jobs * 4) + 1):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def translateBatch(source, outDir, scheduler_in, scheduler_out, force=False, ignore=False, jobs=1, cacheDir=None,
+                   reduceDependencies=False, collapseArrays=False):
+    '''
+        Translates many scripts in a single run. An error in one file does not stop the rest of the batch.
+    :param source: directory or glob pattern with the input scripts
+    :param outDir: directory where the input tree is mirrored with the translated scripts
+    :param jobs: number of processes used to translate, 0 uses every CPU
+    :param cacheDir: directory of a translate_cache.TranslationCache, or None
+    :param reduceDependencies, collapseArrays: see translator
+    :return: list of (input path, output path, None or error message), in input order
+    '''
+    return list(iterBatch(source, outDir, scheduler_in, scheduler_out, force, ignore, jobs, cacheDir,
+                          reduceDependencies, collapseArrays))
+
+
+def displayBatchSummary(results):
+    '''
+    :param results: list or iterator of (input path, output path, None or error message)
+    :return: the number of files that failed
+    '''
+    failed = 0
+    total = 0
+    for inputPath, outputPath, error in results:
+        total += 1
+        if (error is None):
+            print ("ok      " + inputPath + " -> " + outputPath)
+        else:
+            print ("failed  " + inputPath + ": " + error)
+            failed += 1
+    print (str(total - failed) + " translated, " + str(failed) + " failed.")
+    return failed
+
+
+def batchMain(args):
+    source = _getOption(args, "--batch", "Batch input")
+    outDir = _getOption(args, "--out", "Batch output directory")
+    if (outDir is None):
+        sys.stderr.write("Batch output directory not specified\n")
+        displayUsage()
+        return 1
+    scheduler_in = _getOption(args, "-i", "Scheduler type for the input") or ""
+    scheduler_out = _getOption(args, "-o", "Scheduler type for the output") or ""
+    jobs = _getOption(args, "--jobs", "Number of jobs") or "1"
+    if (not jobs.isdigit()):
+        sys.stderr.write("Invalid number of jobs: \"" + jobs + "\"\n")
+        displayUsage()
+        return 1
+    results = iterBatch(source, outDir, scheduler_in, scheduler_out, "--force" in args, "--ignore" in args, int(jobs),
+                        _getOption(args, "--cache-dir", "Cache directory"), "--reduce-deps" in args,
+                        "--collapse-arrays" in args)
+    if (displayBatchSummary(results) > 0):
+        return 1
+    return 0
+
+
+def streamMain(args):
+    scheduler_in = _getOption(args, "-i", "Scheduler type for the input") or ""
+    scheduler_out = _getOption(args, "-o", "Scheduler type for the output") or ""
+    try:
+        writer = translator([], scheduler_in, scheduler_out, "--force" in args, "--ignore" in args, "stdin",
+                            reduceDependencies="--reduce-deps" in args)
+        # readline instead of iterating over the file, which reads ahead and would wait for a full buffer in a pipe
+        writer.stream(iter(sys.stdin.readline, ""), sys.stdout)
+    except TranslationError as e:
+        return displayError(e)
+    sys.stdout.write("\n")
+    return 0
+
+
+def serveMain(args):
+    address = _getOption(args, "--serve", "Server address")
+    import socket
+    import translate_cache
+    import translate_server  # only the server needs them
+    cache = translate_cache.TranslationCache(directory=_getOption(args, "--cache-dir", "Cache directory"))
+    try:
+        translate_server.serve(address, cache)
+    except (ValueError, socket.error) as e:
+        sys.stderr.write(str(e) + "\n")
+        return 1
+    return 0
+
+
 def main():
-    writer = translator("", "", "")
-    if len(sys.argv) < 4 or len(sys.argv) > 7:
+    profile = "--profile" in sys.argv or os.environ.get("TRANSLATOR_PROFILE", "") not in ("", "0")
+    statsFile = _getOption(sys.argv, "--profile-output", "Profile output file")
+    if (not profile and statsFile is None):
+        commandMain()
+        return
+    # take the profiling options out, the other modes do not expect them
+    if ("--profile" in sys.argv):
+        sys.argv.remove("--profile")
+    if (statsFile is not None):
+        index = sys.argv.index("--profile-output")
+        del sys.argv[index:index + 2]
+    import translate_profile
+    try:
+        translate_profile.run(commandMain, statsFile, translator)
+    finally:
+        translate_profile.report(sys.stderr)
+
+
+def commandMain():
+    if ("--batch" in sys.argv):
+        sys.exit(batchMain(sys.argv[1:]))
+    if ("--stream" in sys.argv):
+        sys.exit(streamMain(sys.argv[1:]))
+    if ("--serve" in sys.argv):
+        sys.exit(serveMain(sys.argv[1:]))
+    if len(sys.argv) < 4:
         for x in range(1,len(sys.argv)):
             if (sys.argv[x] == "--help"):
-                print displayHelp(writer)
+                print displayHelp()
                 sys.exit(0)
             elif (sys.argv[x] == "--helpUGE"):
-                print displayHelp(writer, False)
+                print displayHelp(None, False)
+                table = script_scheduler_writer.getSchedulerTable("UGE")
                 print "Supported commands for UGE:"
-                print ",".join(writer.listAvailUGECommands) + ".\n"
+                print ",".join(sorted([x for x, entry in table.options.items() if entry[0] is not None])) + ".\n"
+                sys.exit(0)
+            elif (sys.argv[x] == "--helpSLURM"):
+                table = script_scheduler_writer.getSchedulerTable("SLURM")
+                print displayHelp(None, False)
+                print "Supported commands for SLURM:"
+                print ",".join(sorted([x for x, entry in table.options.items() if entry[0] is not None])) + "."
+                print "Supported dependencies: " + ",".join(sorted(table.dependencyTypes)) + ", on job ids or on " \
+                    + "variables set with VARIABLE=$(sbatch ...).\n"
                 sys.exit(0)
             elif (sys.argv[x] == "--develop_TEST"):
                 writer = translator("", "", "")
@@ -363,6 +1168,8 @@ def main():
                         print ("The test was successful.\n")
                     else:
                         print ("The test failed.\n")
+                except TranslationError as e:
+                    sys.exit(displayError(e))
                 except IOError:
                     sys.stderr.write("Cannot open file: " + file + "\n")
                     displayUsage()
@@ -382,6 +1189,8 @@ def main():
                     else:
                         print ("The test failed.\n")
                     sys.exit(0)
+                except TranslationError as e:
+                    sys.exit(displayError(e))
                 except IOError:
                     sys.stderr.write("Cannot open file: " + file + "\n")
                     displayUsage()
@@ -393,10 +1202,15 @@ def main():
         scheduler_out = ""
         force = False
         ignore = False
-        for x in range(2, len(sys.argv)):
+        reduceDependencies = False
+        collapseArrays = False
+        cache = None
+        x = 2
+        while (x < len(sys.argv)):
             if (sys.argv[x] == "-i"):
                 if (x + 1 < len(sys.argv)):
                     scheduler_in = sys.argv[x + 1]
+                    x += 1
                 else:
                     sys.stderr.write("Scheduler type for the input not specified")
                     displayUsage()
@@ -404,6 +1218,7 @@ def main():
             elif (sys.argv[x] == "-o"):
                 if (x + 1 < len(sys.argv)):
                     scheduler_out = sys.argv[x + 1]
+                    x += 1
                 else:
                     sys.stderr.write("Scheduler type for the output not specified")
                     displayUsage()
@@ -412,6 +1227,24 @@ def main():
                 force = True
             elif (sys.argv[x] == "--ignore"):
                 ignore = True
+            elif (sys.argv[x] == "--reduce-deps"):
+                reduceDependencies = True
+            elif (sys.argv[x] == "--collapse-arrays"):
+                collapseArrays = True
+            elif (sys.argv[x] == "--cache-dir"):
+                if (x + 1 < len(sys.argv)):
+                    import translate_cache
+                    cache = translate_cache.TranslationCache(0, sys.argv[x + 1])
+                    x += 1
+                else:
+                    sys.stderr.write("Cache directory not specified")
+                    displayUsage()
+                    sys.exit(1)
+            elif (sys.argv[x] != ""):  # empty arguments come from empty shell variables
+                sys.stderr.write("Unknown option: " + sys.argv[x] + "\n")
+                displayUsage()
+                sys.exit(1)
+            x += 1
         if (file == "stdin"):
             with sys.stdin as f:
                 inputList = f.readlines()
@@ -423,12 +1256,22 @@ def main():
                 sys.stderr.write("Cannot open file: "+file+"\n")
                 displayUsage()
                 sys.exit(-1)
-        name = file.split(".")
-        name = name[0].replace(" ","")
-        name = name.split("/")
-        name = name[name.__len__()-1]
-        writer = translator(inputList, scheduler_in, scheduler_out, force, ignore, name)
-        print (writer.getScript())
+        script = None
+        try:
+            writer = translator(inputList, scheduler_in, scheduler_out, force, ignore, _scriptName(file), cache,
+                                reduceDependencies, collapseArrays)
+            # translate before writing, so errors leave nothing on the output
+            if (cache is None):
+                writer._translate()
+            else:
+                script = writer.getScript()
+        except TranslationError as e:
+            sys.exit(displayError(e))
+        if (script is None):
+            writer.scriptWriter.writeTo(sys.stdout)
+        else:
+            sys.stdout.write(script)
+        sys.stdout.write("\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+'''
+Long-running translation server, so that programs translating many scripts pay for the interpreter startup only once.
+
+Start it with: translate_script.py --serve unix:/path/to/socket
+The protocol is one JSON object per line, in both directions. A request is
+    {"script": "...", "scheduler_in": "UGE", "scheduler_out": "SLURM", "force": false, "ignore": false, "name": "Name",
+     "reduce_deps": false, "collapse_arrays": false}
+where only "script" is required (a string or a list of lines), and the response is either
+    {"ok": true, "script": "..."}
+or
+    {"ok": false, "error": {"type": "InvalidDependency", "message": "...", "token": "...", "line": 5, "exitCode": 4}}
+The request {"stats": true} returns the counters of the cache of the server: {"ok": true, "stats": {"hits": 3, ...}}
+A connection can send any number of requests, and connections are handled concurrently, each on its own thread.
+Warnings about ignored commands are written to the stderr of the server.
+
+TranslationClient (or translate(), for a single request) is the client side.
+'''
+
+import SocketServer
+import errno
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import threading
+import script_scheduler_writer
+import translate_script
+
+
+def _parseAddress(address):
+    '''
+    :param address: "unix:PATH"
+    :return: PATH
+    '''
+    if (not address.startswith("unix:") or address == "unix:"):
+        raise ValueError("Address not supported: \"" + address + "\". Use unix:PATH.")
+    return address[len("unix:"):]
+
+
+def _str(value):
+    '''
+    :return: value as a str, json decodes strings as unicode
+    '''
+    if (isinstance(value, unicode)):
+        return value.encode("utf-8")
+    return value
+
+
+def _errorResponse(type, message, token=None, line=None, exitCode=1):
+    return {"ok": False, "error": {"type": type, "message": message, "token": token, "line": line,
+                                   "exitCode": exitCode}}
+
+
+def handleRequest(request, cache=None):
+    '''
+        Translates one request of the protocol.
+    :param request: a line with a JSON object, see this file header
+    :param cache: translate_cache.TranslationCache shared by the requests, or None
+    :return: the response, as a dictionary
+    '''
+    try:
+        request = json.loads(request)
+    except ValueError as e:
+        return _errorResponse("InvalidRequest", "Invalid JSON: " + str(e))
+    if (isinstance(request, dict) and request.get("stats")):
+        if (cache is None):
+            return {"ok": True, "stats": {}}
+        return {"ok": True, "stats": cache.stats()}
+    if (not isinstance(request, dict) or "script" not in request):
+        return _errorResponse("InvalidRequest", "A request is a JSON object with at least \"script\".")
+    script = request["script"]
+    if (isinstance(script, basestring)):
+        script = _str(script).splitlines(True)
+    elif (isinstance(script, list)):
+        script = [_str(x) for x in script]
+    else:
+        return _errorResponse("InvalidRequest", "\"script\" must be a string or a list of lines.")
+    try:
+        writer = translate_script.translator(script, _str(request.get("scheduler_in", "")),
+                                             _str(request.get("scheduler_out", "")), bool(request.get("force")),
+                                             bool(request.get("ignore")), _str(request.get("name", "Name")), cache,
+                                             bool(request.get("reduce_deps")), bool(request.get("collapse_arrays")))
+        return {"ok": True, "script": writer.getScript()}
+    except script_scheduler_writer.TranslationError as e:
+        return _errorResponse(e.__class__.__name__, e.message, e.token, e.line, e.exitCode)
+    except Exception as e:  # a bad script must not stop the server
+        return _errorResponse(e.__class__.__name__, str(e))
+
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        while True:
+            request = self.rfile.readline()
+            if (request == ""):
+                break
+            if (request.strip() == ""):
+                continue
+            self.wfile.write(json.dumps(handleRequest(request, self.server.cache)) + "\n")
+            self.wfile.flush()
+
+
+def _isServing(path):
+    '''
+    :return: True if a server accepts connections on the socket at path
+    '''
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except socket.error:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+class TranslationServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, address, cache=None):
+        self.cache = cache
+        path = _parseAddress(address)
+        if (os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode)):
+            if (_isServing(path)):
+                raise socket.error(errno.EADDRINUSE, "A server is already running on \"" + path + "\".")
+            os.unlink(path)  # left behind by a server that did not stop cleanly
+        SocketServer.UnixStreamServer.__init__(self, path, _RequestHandler)
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        if (os.path.exists(self.server_address)):
+            os.unlink(self.server_address)
+
+
+def serve(address, cache=None):
+    '''
+        Serves translations on address ("unix:PATH") until interrupted or terminated (SIGTERM), then removes the
+        socket. Raises socket.error if another server is running on address.
+    :param cache: translate_cache.TranslationCache shared by the requests, or None
+    '''
+    server = TranslationServer(address, cache)
+
+    def terminate(signum, frame):
+        # shutdown waits for serve_forever to return, which runs on this thread
+        threading.Thread(target=server.shutdown).start()
+    try:
+        previousHandler = signal.signal(signal.SIGTERM, terminate)
+    except ValueError:  # signals can only be handled on the main thread
+        previousHandler = None
+    sys.stderr.write("Serving translations on " + address + "\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if (previousHandler is not None):
+            signal.signal(signal.SIGTERM, previousHandler)
+        server.server_close()
+
+
+class TranslationClient:
+    '''
+        Connection to a TranslationServer, usable for any number of requests.
+    '''
+    def __init__(self, address):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(_parseAddress(address))
+        self.file = self.socket.makefile("rwb")
+
+    def request(self, script, scheduler_in="", scheduler_out="", force=False, ignore=False, name="Name",
+                reduceDependencies=False, collapseArrays=False):
+        '''
+        :param script: string or list of lines
+        :return: the response of the server, as a dictionary
+        '''
+        request = {"script": script, "scheduler_in": scheduler_in, "scheduler_out": scheduler_out, "force": force,
+                   "ignore": ignore, "name": name}
+        if (reduceDependencies):
+            request["reduce_deps"] = True
+        if (collapseArrays):
+            request["collapse_arrays"] = True
+        self.file.write(json.dumps(request) + "\n")
+        self.file.flush()
+        response = self.file.readline()
+        if (response == ""):
+            raise IOError("Connection closed by the translation server.")
+        return json.loads(response)
+
+    def translate(self, script, scheduler_in="", scheduler_out="", force=False, ignore=False, name="Name",
+                  reduceDependencies=False, collapseArrays=False):
+        '''
+        :return: the translated script
+        Raises the same TranslationError subclass the translator raised in the server.
+        '''
+        response = self.request(script, scheduler_in, scheduler_out, force, ignore, name, reduceDependencies,
+                                collapseArrays)
+        if (response["ok"]):
+            return _str(response["script"])
+        error = response["error"]
+        errorClass = getattr(script_scheduler_writer, _str(error["type"]), None)
+        if (not (isinstance(errorClass, type) and issubclass(errorClass, script_scheduler_writer.TranslationError))):
+            errorClass = script_scheduler_writer.TranslationError
+        raise errorClass(_str(error["message"]), _str(error["token"]), error["line"])
+
+    def stats(self):
+        '''
+        :return: the counters of the cache of the server
+        '''
+        self.file.write(json.dumps({"stats": True}) + "\n")
+        self.file.flush()
+        return json.loads(self.file.readline())["stats"]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+def translate(address, script, scheduler_in="", scheduler_out="", force=False, ignore=False, name="Name",
+              reduceDependencies=False, collapseArrays=False):
+    '''
+        Translates a single script on the server at address, see TranslationClient.translate
+    '''
+    client = TranslationClient(address)
+    try:
+        return client.translate(script, scheduler_in, scheduler_out, force, ignore, name, reduceDependencies,
+                                collapseArrays)
+    finally:
+        client.close()